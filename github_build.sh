@@ -1,4 +1,7 @@
 #!/usr/bin/env bash
+set -e
 
-python3 src/main.py /static_site_generator/
-
+python3 src/main.py /static_site_generator/ --deploy-manifest
+# Copies what changed since the last deploy into deploy/ and moves deploy-baseline.json forward;
+# commit the baseline together with docs/ so the next build, local or CI, starts from it
+python3 src/deploy.py deploy --dest docs
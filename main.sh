@@ -1,4 +1,3 @@
 #!/usr/bin/env bash
 
-python3 src/main.py
-cd public && python3 -m http.server 8888
+python3 src/main.py --watch
@@ -0,0 +1,4 @@
+# Lets the site be built with `python3 src`, the same as `python3 src/main.py`
+from main import main
+
+main()
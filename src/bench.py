@@ -0,0 +1,425 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import tempfile
+import time
+from collections.abc import Callable
+from typing import Any
+
+from blocktext import BlockType, block_to_block_type, markdown_to_blocks, markdown_to_html_node
+from htmlnode import HTMLNode, LeafNode, ParentNode
+from page_generation import RenderOptions, generate_page, generate_pages_parallel, generate_pages_recursive
+from site_index import SiteIndex
+from textnode import TextNode, TextType, strip_and_replace_newlines
+
+BENCH_TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>
+"""
+
+# The lazy patterns regexing.py used before its linear scanner, for the chained-pass baseline
+ORIGINAL_IMAGE_PATTERN = re.compile(r"!\[(.*?)\]\((.*?)\)")
+ORIGINAL_LINK_PATTERN = re.compile(r"(?<!!)\[(.*?)\]\((.*?)\)")
+
+# Median cumulative import time of main.py; a regression past this fails CI
+STARTUP_BUDGET_MS = 60.0
+
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore".split()
+
+
+def time_call(fn: Callable[[], Any], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _ = fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class CorpusSpec:
+    def __init__(self, pages: int = 1000, depth: int = 3, fanout: int = 8, links_per_paragraph: int = 5, paragraphs: int = 8, code_lines: int = 40, seed: int = 0) -> None:
+        self.pages: int = pages
+        self.depth: int = depth
+        self.fanout: int = fanout
+        self.links_per_paragraph: int = links_per_paragraph
+        self.paragraphs: int = paragraphs
+        self.code_lines: int = code_lines
+        self.seed: int = seed
+
+    def to_dict(self) -> dict[str, int]:
+        return dict(vars(self))
+
+
+def synthetic_paragraph(rng: random.Random, links: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(40)]
+    for i in range(links):
+        words.insert(rng.randrange(len(words)), f"[{rng.choice(WORDS)} {i}](/page/{rng.randrange(1000)})")
+    words[rng.randrange(len(words))] = f"**{rng.choice(WORDS)}**"
+    words[rng.randrange(len(words))] = f"_{rng.choice(WORDS)}_"
+    words[rng.randrange(len(words))] = f"`{rng.choice(WORDS)}`"
+    return " ".join(words)
+
+
+def synthetic_page(rng: random.Random, spec: CorpusSpec, index: int) -> str:
+    blocks = [f"# Page {index}"]
+
+    for i in range(spec.paragraphs):
+        blocks.append(synthetic_paragraph(rng, spec.links_per_paragraph))
+        if i % 3 == 0:
+            blocks.append(f"## Section {i}")
+        if i % 4 == 1:
+            blocks.append("\n".join(f"- {rng.choice(WORDS)} [item](/item/{j})" for j in range(6)))
+        if i % 4 == 3:
+            blocks.append("\n".join(f"{j}. {rng.choice(WORDS)} **{rng.choice(WORDS)}**" for j in range(1, 7)))
+
+    blocks.append("> " + synthetic_paragraph(rng, 1))
+    blocks.append("```\n" + "\n".join(f"    line_{j} = {rng.choice(WORDS)}({j})" for j in range(spec.code_lines)) + "\n```")
+    blocks.append(f"![image {index}](/images/{index}.png)")
+
+    return "\n\n".join(blocks) + "\n"
+
+
+def generate_corpus(root: str, spec: CorpusSpec) -> str:
+    rng = random.Random(spec.seed)
+    content_dir = os.path.join(root, "content")
+    os.makedirs(content_dir, exist_ok=True)
+
+    with open(os.path.join(root, "template.html"), "w") as f:
+        _ = f.write(BENCH_TEMPLATE)
+
+    for index in range(spec.pages):
+        # Spread pages over a tree `depth` levels deep with `fanout` directories per level
+        parts: list[str] = []
+        bucket = index
+        for _ in range(spec.depth):
+            parts.append(f"dir{bucket % spec.fanout}")
+            bucket //= spec.fanout
+
+        page_dir = os.path.join(content_dir, *parts)
+        os.makedirs(page_dir, exist_ok=True)
+        with open(os.path.join(page_dir, f"page{index}.md"), "w") as f:
+            _ = f.write(synthetic_page(rng, spec, index))
+
+    return content_dir
+
+
+def load_corpus(content_dir: str) -> list[str]:
+    documents: list[str] = []
+    for dir_path, dir_names, file_names in os.walk(content_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            with open(os.path.join(dir_path, file_name), "r") as f:
+                documents.append(f.read())
+    return documents
+
+
+def bench_stages(root: str, content_dir: str, repeat: int) -> dict[str, dict[str, float | int]]:
+    documents = load_corpus(content_dir)
+    blocks = [block for document in documents for block in markdown_to_blocks(document)]
+    inline_blocks = [block for block in blocks if block_to_block_type(block) != BlockType.CODE]
+    html_nodes: list[HTMLNode] = [markdown_to_html_node(document) for document in documents]
+
+    def full_build():
+        dest_dir = os.path.join(root, "docs")
+        if os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+        os.mkdir(dest_dir)
+        generate_pages_recursive(content_dir, os.path.join(root, "template.html"), dest_dir, "/")
+
+    def pipeline_build():
+        dest_dir = os.path.join(root, "docs")
+        if os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+        _ = generate_pages_parallel(content_dir, os.path.join(root, "template.html"), dest_dir, "/", options=RenderOptions(pipeline=4))
+
+    stages: list[tuple[str, int, Callable[[], Any]]] = [
+        ("site_index", len(documents), lambda: SiteIndex.build(content_dir, os.path.join(root, "docs"))),
+        ("markdown_to_blocks", len(documents), lambda: [markdown_to_blocks(document) for document in documents]),
+        ("block_to_block_type", len(blocks), lambda: [block_to_block_type(block) for block in blocks]),
+        ("nodes_from_text", len(inline_blocks), lambda: [TextNode.nodes_from_text(block) for block in inline_blocks]),
+        ("markdown_to_html_node", len(documents), lambda: [markdown_to_html_node(document) for document in documents]),
+        ("to_html", len(html_nodes), lambda: [node.to_html() for node in html_nodes]),
+        ("generate_pages_recursive", len(documents), full_build),
+        ("pipeline", len(documents), pipeline_build),
+    ]
+
+    results: dict[str, dict[str, float | int]] = {}
+    for name, items, fn in stages:
+        seconds = time_call(fn, repeat)
+        results[name] = {"seconds": seconds, "items": items, "us_per_item": seconds / items * 1e6 if items else 0.0}
+    return results
+
+
+class DictNode:
+    # Same fields as HTMLNode/TextNode but with a per-instance __dict__, the layout before __slots__
+    def __init__(self, tag: str | None, value: str | None, children: list[DictNode] | None, props: dict[str, Any]) -> None:
+        self.tag: str | None = tag
+        self.value: str | None = value
+        self.children: list[DictNode] | None = children
+        self.props: dict[str, Any] = props
+
+
+def count_nodes(node: HTMLNode) -> int:
+    return 1 + sum(count_nodes(child) for child in node.children or [])
+
+
+def mirror_as_dict_nodes(node: HTMLNode) -> DictNode:
+    children = [mirror_as_dict_nodes(child) for child in node.children] if node.children is not None else None
+    return DictNode(node.tag, node.value, children, dict(node.props))
+
+
+def mirror_as_slotted_nodes(node: HTMLNode) -> HTMLNode:
+    if node.children is None:
+        return LeafNode(node.tag, node.value or "", dict(node.props))
+    return ParentNode(node.tag or "", [mirror_as_slotted_nodes(child) for child in node.children], dict(node.props))
+
+
+def measure_bytes(build: Callable[[], Any]) -> tuple[int, Any]:
+    import gc
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(spec: CorpusSpec) -> dict[str, Any]:
+    rng = random.Random(spec.seed)
+    document = "\n\n".join(synthetic_page(rng, spec, index) for index in range(spec.pages))
+
+    build_bytes, tree = measure_bytes(lambda: markdown_to_html_node(document))
+    nodes = count_nodes(tree)
+
+    # Both mirrors share the original strings, so they measure node layout and containers only
+    slotted_bytes, _ = measure_bytes(lambda: mirror_as_slotted_nodes(tree))
+    dict_bytes, _ = measure_bytes(lambda: mirror_as_dict_nodes(tree))
+
+    return {
+        "document_chars": len(document),
+        "nodes": nodes,
+        "build_bytes_per_node": build_bytes / nodes,
+        "slotted_bytes_per_node": slotted_bytes / nodes,
+        "dict_bytes_per_node": dict_bytes / nodes,
+    }
+
+
+def bench_streaming(megabytes: float, seed: int = 0) -> dict[str, Any]:
+    import tracemalloc
+
+    rng = random.Random(seed)
+    spec = CorpusSpec(seed=seed)
+    root = tempfile.mkdtemp(prefix="ssg-stream-")
+    try:
+        source_path = os.path.join(root, "large.md")
+        template_path = os.path.join(root, "template.html")
+        with open(template_path, "w") as f:
+            _ = f.write(BENCH_TEMPLATE)
+
+        with open(source_path, "w") as f:
+            index = 0
+            while f.tell() < megabytes * 1024 * 1024:
+                _ = f.write(synthetic_page(rng, spec, index) + "\n")
+                index += 1
+
+        source_bytes = os.path.getsize(source_path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            _ = generate_page(source_path, template_path, os.path.join(root, "large.html"))
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {"source_bytes": source_bytes, "seconds": seconds, "peak_traced_bytes": peak, "peak_to_source_ratio": peak / source_bytes}
+    finally:
+        shutil.rmtree(root)
+
+
+def link_heavy_paragraph(links: int) -> str:
+    return " ".join(f"see [link {i}](/page/{i}) and ![image {i}](/images/{i}.png) with **bold {i}**" for i in range(links))
+
+
+def original_split_nodes(old_nodes: list[TextNode], pattern: re.Pattern[str], text_type: TextType, template: str) -> list[TextNode]:
+    # The regex-and-resplit passes as they were before the single-pass scanner, frozen so the baseline stays put
+    node_list: list[TextNode] = []
+
+    for node in old_nodes:
+        if node.text_type != TextType.PLAIN_TEXT:
+            node_list.append(node)
+            continue
+
+        current_split_text_nodes = [TextNode(node.text, TextType.PLAIN_TEXT)]
+        for text, url in pattern.findall(node.text):
+            current_text = current_split_text_nodes.pop().text
+            split_text_list = current_text.split(template.format(text, url))
+            current_split_text_nodes += [TextNode(split_text_list[0], TextType.PLAIN_TEXT),
+                                         TextNode(text, text_type, url),
+                                         TextNode(split_text_list[1], TextType.PLAIN_TEXT)]
+
+        if current_split_text_nodes[-1].text == "":
+            _ = current_split_text_nodes.pop()
+        if current_split_text_nodes[0].text == "":
+            _ = current_split_text_nodes.pop(0)
+
+        node_list += current_split_text_nodes
+
+    return node_list
+
+
+def chained_split_passes(text: str) -> list[TextNode]:
+    # The five-pass pipeline nodes_from_text used before the single-pass scanner, kept as a baseline
+    nodes = [TextNode(strip_and_replace_newlines(text), TextType.PLAIN_TEXT)]
+    nodes = original_split_nodes(nodes, ORIGINAL_LINK_PATTERN, TextType.LINK, "[{}]({})")
+    nodes = original_split_nodes(nodes, ORIGINAL_IMAGE_PATTERN, TextType.IMAGE, "![{}]({})")
+    nodes = TextNode.split_nodes_delimiter(nodes, "`", TextType.CODE_TEXT)
+    nodes = TextNode.split_nodes_delimiter(nodes, "**", TextType.BOLD_TEXT)
+    return TextNode.split_nodes_delimiter(nodes, "_", TextType.ITALIC_TEXT)
+
+
+def bench_inline(link_counts: list[int]) -> list[dict[str, Any]]:
+    results: list[dict[str, Any]] = []
+
+    for links in link_counts:
+        text = link_heavy_paragraph(links)
+        chained = time_call(lambda: chained_split_passes(text))
+        single_pass = time_call(lambda: TextNode.nodes_from_text(text))
+        results.append({
+            "links": links,
+            "chars": len(text),
+            "chained_seconds": chained,
+            "single_pass_seconds": single_pass,
+            "speedup": chained / single_pass if single_pass else None,
+        })
+
+    return results
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    # "import time: <self us> | <cumulative us> | <module>", indented by nesting depth
+    modules: dict[str, tuple[int, int]] = {}
+    for line in stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        modules[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return modules
+
+
+def bench_startup(module: str, runs: int, budget_ms: float) -> dict[str, Any]:
+    import statistics
+    import subprocess
+    import sys
+
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    import_us: list[int] = []
+    process_seconds: list[float] = []
+    modules: dict[str, tuple[int, int]] = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=src_dir, capture_output=True, text=True, check=True)
+        process_seconds.append(time.perf_counter() - start)
+        modules = parse_importtime(completed.stderr)
+        import_us.append(modules[module][1])
+
+    median_ms = statistics.median(import_us) / 1000
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    return {
+        "module": module,
+        "runs": runs,
+        "median_import_ms": median_ms,
+        "median_process_ms": statistics.median(process_seconds) * 1000,
+        "budget_ms": budget_ms,
+        "within_budget": median_ms <= budget_ms,
+        "slowest_modules": [{"module": name, "self_ms": self_us / 1000} for name, (self_us, _) in slowest],
+    }
+
+
+def environment() -> dict[str, str | float]:
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(), "machine": platform.machine(), "timestamp": time.time()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the site generator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    corpus_parser = subparsers.add_parser("corpus", help="time each build stage over a synthetic content tree")
+    _ = corpus_parser.add_argument("--pages", type=int, default=1000)
+    _ = corpus_parser.add_argument("--depth", type=int, default=3, help="directory nesting depth")
+    _ = corpus_parser.add_argument("--fanout", type=int, default=8, help="directories per nesting level")
+    _ = corpus_parser.add_argument("--links", type=int, default=5, help="links per paragraph")
+    _ = corpus_parser.add_argument("--paragraphs", type=int, default=8, help="paragraphs per page")
+    _ = corpus_parser.add_argument("--code-lines", type=int, default=40, help="lines in each page's code block")
+    _ = corpus_parser.add_argument("--seed", type=int, default=0)
+    _ = corpus_parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the best one is reported")
+    _ = corpus_parser.add_argument("--keep", metavar="DIR", help="generate the corpus into DIR and keep it")
+
+    memory_parser = subparsers.add_parser("memory", help="bytes per HTML node for one large document")
+    _ = memory_parser.add_argument("--pages", type=int, default=200, help="synthetic pages concatenated into the document")
+    _ = memory_parser.add_argument("--seed", type=int, default=0)
+
+    streaming_parser = subparsers.add_parser("streaming", help="peak memory while rendering one very large source file")
+    _ = streaming_parser.add_argument("--mb", type=float, default=20, help="size of the generated source file")
+    _ = streaming_parser.add_argument("--seed", type=int, default=0)
+
+    inline_parser = subparsers.add_parser("inline", help="compare the inline scanner with the chained split passes")
+    _ = inline_parser.add_argument("--links", type=int, nargs="+", default=[10, 100, 500, 1000], help="links per paragraph")
+
+    startup_parser = subparsers.add_parser("startup", help="import time of the CLI with -X importtime, checked against a budget")
+    _ = startup_parser.add_argument("--module", default="main")
+    _ = startup_parser.add_argument("--runs", type=int, default=7)
+    _ = startup_parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="exit non-zero when the median import time is over this")
+
+    for subparser in (corpus_parser, memory_parser, streaming_parser, inline_parser, startup_parser):
+        _ = subparser.add_argument("--out", help="write the JSON report here instead of stdout")
+
+    args = parser.parse_args()
+    report: dict[str, Any] = {"environment": environment()}
+
+    if args.command == "startup":
+        report["startup"] = bench_startup(args.module, args.runs, args.budget_ms)
+    elif args.command == "inline":
+        report["inline"] = bench_inline(args.links)
+    elif args.command == "streaming":
+        report["streaming"] = bench_streaming(args.mb, args.seed)
+    elif args.command == "memory":
+        report["memory"] = bench_memory(CorpusSpec(pages=args.pages, seed=args.seed))
+    else:
+        spec = CorpusSpec(args.pages, args.depth, args.fanout, args.links, args.paragraphs, args.code_lines, args.seed)
+        root = args.keep if args.keep else tempfile.mkdtemp(prefix="ssg-bench-")
+        try:
+            content_dir = generate_corpus(root, spec)
+            report["corpus"] = spec.to_dict()
+            report["stages"] = bench_stages(root, content_dir, args.repeat)
+        finally:
+            if not args.keep:
+                shutil.rmtree(root)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            _ = f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.command == "startup" and not report["startup"]["within_budget"]:
+        raise SystemExit(f"Importing {args.module} took {report['startup']['median_import_ms']:.1f} ms, over the {args.budget_ms:.1f} ms budget")
+
+if __name__ == "__main__":
+    main()
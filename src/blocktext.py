@@ -1,11 +1,12 @@
+from collections.abc import Iterable, Iterator
 from enum import Enum
 import re
 
 from htmlnode import HTMLNode, LeafNode, ParentNode
-from textnode import TextNode, strip_and_replace_newlines
-
-def markdown_to_blocks(md: str) -> list[str]:
-    return list(filter(lambda s: s != "", map(lambda s: s.strip(), md.split("\n\n"))))
+from textnode import TextNode
+from fragment_cache import FragmentCache
+from image_index import ImageIndex, image_urls
+from link_check import LinkRef, fragment_refs, node_refs, record_refs
 
 class BlockType(Enum):
     PARAGRAPH = "paragraph"
@@ -15,71 +16,144 @@ class BlockType(Enum):
     UNORDERED_LIST = "unordered_list"
     ORDERED_LIST = "ordered_list"
 
-def block_to_block_type(block: str) -> BlockType:
-    if re.search(r"^#{1,6} ", block):
+HEADING_PATTERN = re.compile(r"#{1,6} ")
+CODE_FENCE = "```"
+
+def classify_lines(lines: list[str]) -> BlockType:
+    first_line = lines[0]
+
+    if HEADING_PATTERN.match(first_line):
         return BlockType.HEADING
-    elif re.search(r"^```[\s\S]*```$", block):
+    # A lone fence line is not a code block, it needs an opening and a closing fence
+    elif first_line.startswith(CODE_FENCE) and lines[-1].endswith(CODE_FENCE) and (len(lines) > 1 or len(first_line) >= 2 * len(CODE_FENCE)):
         return BlockType.CODE
-    elif re.search(r"^> ", block):
+    elif first_line.startswith("> "):
         return BlockType.QUOTE
-    elif re.search(r"^(?:- .*(?:\n|$))+$", block):
+    elif all(line.startswith("- ") for line in lines):
         return BlockType.UNORDERED_LIST
-    
-    ordered_list: bool = True
-    for i, line in enumerate(block.splitlines(), start = 1):
-        if not line.startswith(f"{i}. "):
-            ordered_list = False
-
-    if ordered_list:
+    elif all(line.startswith(f"{i}. ") for i, line in enumerate(lines, start = 1)):
         return BlockType.ORDERED_LIST
-    
-    return BlockType.PARAGRAPH
-
-def markdown_to_html_node(md: str)-> HTMLNode:
-    blocks: list[str] = markdown_to_blocks(md)
-
-    final_node: ParentNode = ParentNode("div", [])
-
-    for block in blocks:
-        current_node: ParentNode = ParentNode("", [])
-
-        block_type = block_to_block_type(block)
 
-        match block_type.value:
-            case "paragraph":
-                current_node.tag = "p"
-
-            case "heading":
-                hash_count = 0
-                while block[0] == "#":
-                    hash_count += 1
-                    block = block[1:]
-
-                block = block.strip()
-                current_node.tag = f"h{hash_count}"
-
-            case "unordered_list":
-                current_node.tag = "ul"
-
-                block = "".join(map(lambda s: "<li>" + s[2:].strip() + "</li>", block.splitlines()))
-
-            case "ordered_list":
-                current_node.tag = "ol"
-
-                block = "".join(map(lambda s: "<li>" + s[3:].strip() + "</li>", block.splitlines()))
-
-            case "quote":
-                current_node.tag = "blockquote"
-                block = block[2:].strip()
+    return BlockType.PARAGRAPH
 
-            case "code":
-                current_node.tag = "pre"
-                block = "\n".join(filter(lambda s: s, map(lambda s: s.rstrip(), block[3:-3].splitlines())))
-                _ = current_node.add_child(LeafNode("code", block))
-                _ = final_node.add_child(current_node)
-                continue
+def finish_block(lines: list[str]) -> tuple[BlockType, list[str]]:
+    lines[-1] = lines[-1].rstrip()
+    return classify_lines(lines), lines
+
+def scan_numbered_blocks(lines: Iterable[str], fences: bool = True, first_line: int = 1) -> Iterator[tuple[BlockType, list[str], int]]:
+    block: list[str] = []
+    block_start = first_line
+    in_fence = False
+
+    for line_number, line in enumerate(lines, start=first_line):
+        if line.endswith("\n"):
+            line = line[:-1]
+
+        if not in_fence and not line.strip():
+            if block:
+                yield *finish_block(block), block_start
+                block = []
+            continue
+
+        if not block:
+            line = line.lstrip()
+            block_start = line_number
+            # Blank lines inside a fenced code block belong to the block
+            in_fence = fences and line.startswith(CODE_FENCE) and not (len(line.rstrip()) >= 2 * len(CODE_FENCE) and line.rstrip().endswith(CODE_FENCE))
+        elif in_fence and line.rstrip().endswith(CODE_FENCE):
+            in_fence = False
+
+        block.append(line)
+
+    if in_fence:
+        # The fence never closed, so fall back to splitting its lines on blank lines
+        yield from scan_numbered_blocks(block, False, block_start)
+    elif block:
+        yield *finish_block(block), block_start
+
+def scan_blocks(lines: Iterable[str], fences: bool = True) -> Iterator[tuple[BlockType, list[str]]]:
+    for block_type, block_lines, _ in scan_numbered_blocks(lines, fences):
+        yield block_type, block_lines
 
-        current_node.children = list(map(lambda node: node.to_html_node(), TextNode.nodes_from_text(block)))
-        _ = final_node.add_child(current_node)
+def markdown_to_blocks(md: str) -> list[str]:
+    return ["\n".join(lines) for _, lines in scan_blocks(md.split("\n"))]
 
-    return final_node
+def block_to_block_type(block: str) -> BlockType:
+    return classify_lines(block.split("\n"))
+
+def markdown_to_html_nodes(lines: Iterable[str], basepath: str = "/", cache: FragmentCache | None = None, images: ImageIndex | None = None, refs: list[LinkRef] | None = None) -> Iterator[HTMLNode]:
+    # Lazily yields one node per block, so callers can write each block before the next is read
+    for block_type, block_lines, first_line in scan_numbered_blocks(lines):
+        block = "\n".join(block_lines)
+        # Only blocks that can hold a link or image are searched for targets
+        collect = refs is not None and block_type is not BlockType.CODE and "](" in block
+
+        if cache is not None:
+            # Sizes end up in fragments with images, so those keys carry the sizes of their own images only
+            salt = basepath if images is None or "![" not in block else basepath + images.signature(image_urls(block), basepath)
+            cache_key = FragmentCache.key(block_type.value, block, salt)
+            html = cache.get(cache_key)
+            if html is None:
+                html = block_to_sized_html_node(block_type, block_lines, block, basepath, images).to_html()
+                cache.put(cache_key, html)
+            if collect:
+                record_refs(refs, fragment_refs(html), block_lines, first_line, basepath)
+            # Cached fragments are already rendered, so they go in as raw text
+            yield LeafNode(None, html)
+            continue
+
+        node = block_to_sized_html_node(block_type, block_lines, block, basepath, images)
+        if collect:
+            record_refs(refs, node_refs(node), block_lines, first_line, basepath)
+        yield node
+
+def block_to_sized_html_node(block_type: BlockType, lines: list[str], block: str, basepath: str, images: ImageIndex | None) -> HTMLNode:
+    node = block_to_html_node(block_type, lines, block, basepath)
+    if images is not None and "![" in block:
+        images.add_sizes(node)
+    return node
+
+def markdown_to_html_node(md: str, basepath: str = "/", cache: FragmentCache | None = None)-> HTMLNode:
+    return ParentNode("div", list(markdown_to_html_nodes(md.split("\n"), basepath, cache)))
+
+def block_to_html_node(block_type: BlockType, lines: list[str], block: str, basepath: str = "/") -> HTMLNode:
+    current_node: ParentNode = ParentNode("", [])
+
+    match block_type.value:
+        case "paragraph":
+            current_node.tag = "p"
+
+        case "heading":
+            hash_count = 0
+            while block[0] == "#":
+                hash_count += 1
+                block = block[1:]
+
+            block = block.strip()
+            current_node.tag = f"h{hash_count}"
+
+        case "unordered_list":
+            current_node.tag = "ul"
+
+            block = "".join(map(lambda s: "<li>" + s[2:].strip() + "</li>", lines))
+
+        case "ordered_list":
+            current_node.tag = "ol"
+
+            block = "".join(map(lambda data: "<li>" + data[1][len(f"{data[0]}. "):].strip() + "</li>", enumerate(lines, start = 1)))
+
+        case "quote":
+            current_node.tag = "blockquote"
+            block = block[2:].strip()
+
+        case "code":
+            current_node.tag = "pre"
+            code_lines = list(map(lambda s: s.rstrip(), block[3:-3].split("\n")))
+            # Trim the lines the fences sit on but keep blank lines inside the code
+            kept = [i for i, line in enumerate(code_lines) if line]
+            block = "\n".join(code_lines[kept[0]:kept[-1] + 1]) if kept else ""
+            _ = current_node.add_child(LeafNode("code", block))
+            return current_node
+
+    current_node.children = list(map(lambda node: node.to_html_node(basepath), TextNode.nodes_from_text(block)))
+    return current_node
@@ -0,0 +1,45 @@
+import sys
+from typing import Any
+
+
+class BuildLogger:
+    # Stands in for logging.getLogger("ssg") so quiet builds never import logging
+    def __init__(self) -> None:
+        self.verbose: bool = False
+
+    def info(self, message: str, *args: Any) -> None:
+        if self.verbose:
+            get_logger().info(message, *args)
+
+    def error(self, message: str, *args: Any) -> None:
+        get_logger().error(message, *args)
+
+
+logger = BuildLogger()
+
+def get_logger() -> Any:
+    import logging
+
+    return logging.getLogger("ssg")
+
+def configure_logging(verbose: bool = False, capacity: int = 1024) -> None:
+    import logging
+    import logging.handlers
+
+    # Records are buffered and written in batches, so per-page logging never waits on the terminal
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    buffered_handler = logging.handlers.MemoryHandler(capacity, flushLevel=logging.ERROR, target=stream_handler)
+
+    ssg_logger = get_logger()
+    ssg_logger.handlers.clear()
+    ssg_logger.addHandler(buffered_handler)
+    ssg_logger.setLevel(logging.INFO if verbose else logging.WARNING)
+    ssg_logger.propagate = False
+    logger.verbose = verbose
+
+def flush_logging() -> None:
+    if "logging" not in sys.modules:
+        return
+    for handler in get_logger().handlers:
+        handler.flush()
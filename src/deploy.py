@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+from typing import Any
+
+from manifest import CACHE_DIR, atomic_write, hash_file
+from site_index import scan_files
+
+DEPLOY_MANIFEST_PATH = os.path.join(CACHE_DIR, "deploy.json")
+# Kept out of the ignored cache and committed with the site, so a fresh checkout or CI run
+# stages against what was actually deployed last
+DEPLOY_BASELINE_PATH = "deploy-baseline.json"
+DEPLOY_MANIFEST_VERSION = 1
+CHANGES_FILE_NAME = "changes.json"
+
+
+class DeployChanges:
+    def __init__(self, added: list[str], modified: list[str], deleted: list[str]) -> None:
+        # Paths relative to the output tree, "/"-separated and sorted
+        self.added: list[str] = added
+        self.modified: list[str] = modified
+        self.deleted: list[str] = deleted
+
+    def upload(self) -> list[str]:
+        return sorted(self.added + self.modified)
+
+    def summary(self) -> str:
+        return f"{len(self.added)} added, {len(self.modified)} modified, {len(self.deleted)} deleted"
+
+
+def load_json(path: str, dest_dir: str) -> dict[str, Any] | None:
+    try:
+        with open(path, "r") as f:
+            data: dict[str, Any] = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != DEPLOY_MANIFEST_VERSION or data.get("dest_dir") != dest_dir:
+        return None
+    return data
+
+def save_json(path: str, data: dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    atomic_write(path, json.dumps(data, indent=1, sort_keys=True))
+
+
+class DeployManifest:
+    def __init__(self, dest_dir: str = "", files: dict[str, dict[str, Any]] | None = None, deployed: dict[str, str] | None = None) -> None:
+        self.dest_dir: str = dest_dir
+        # rel path -> {"hash", "mtime_ns", "size"} of the tree as last built
+        self.files: dict[str, dict[str, Any]] = files if files is not None else {}
+        # rel path -> hash as of the last staged deploy; empty until the first one
+        self.deployed: dict[str, str] = deployed if deployed is not None else {}
+
+    @staticmethod
+    def load(path: str, dest_dir: str, baseline_path: str = DEPLOY_BASELINE_PATH) -> DeployManifest:
+        # The stat cache is local to this checkout; the baseline travels with the repository
+        data = load_json(path, dest_dir)
+        baseline = load_json(baseline_path, dest_dir)
+        return DeployManifest(dest_dir, data["files"] if data is not None else None, baseline["deployed"] if baseline is not None else None)
+
+    def save(self, path: str) -> None:
+        save_json(path, {"version": DEPLOY_MANIFEST_VERSION, "dest_dir": self.dest_dir, "files": self.files})
+
+    def save_baseline(self, baseline_path: str = DEPLOY_BASELINE_PATH) -> None:
+        save_json(baseline_path, {"version": DEPLOY_MANIFEST_VERSION, "dest_dir": self.dest_dir, "deployed": self.deployed})
+
+    def refresh(self) -> None:
+        # Outputs whose stat is unchanged keep their hash, so only rewritten files are read
+        files: dict[str, dict[str, Any]] = {}
+        for entry in scan_files(self.dest_dir):
+            if entry.rel_path.endswith(".tmp"):
+                continue
+            record = self.files.get(entry.rel_path)
+            if record is None or record["mtime_ns"] != entry.mtime_ns or record["size"] != entry.size:
+                record = {"hash": hash_file(entry.path), "mtime_ns": entry.mtime_ns, "size": entry.size}
+            files[entry.rel_path] = record
+        self.files = files
+
+    def changes(self) -> DeployChanges:
+        # Compared with the last deploy rather than the last build, so builds between deploys add up
+        added = sorted(rel_path for rel_path in self.files if rel_path not in self.deployed)
+        modified = sorted(rel_path for rel_path, record in self.files.items() if rel_path in self.deployed and self.deployed[rel_path] != record["hash"])
+        deleted = sorted(rel_path for rel_path in self.deployed if rel_path not in self.files)
+        return DeployChanges(added, modified, deleted)
+
+
+def update_deploy_manifest(dest_dir: str, manifest_path: str = DEPLOY_MANIFEST_PATH, baseline_path: str = DEPLOY_BASELINE_PATH) -> DeployChanges:
+    manifest = DeployManifest.load(manifest_path, dest_dir, baseline_path)
+    manifest.refresh()
+    manifest.save(manifest_path)
+    return manifest.changes()
+
+
+def stage_changes(dest_dir: str, staging_dir: str, manifest_path: str = DEPLOY_MANIFEST_PATH, baseline_path: str = DEPLOY_BASELINE_PATH) -> DeployChanges:
+    if os.path.abspath(staging_dir) == os.path.abspath(dest_dir):
+        raise Exception("The staging directory must not be the output directory")
+
+    manifest = DeployManifest.load(manifest_path, dest_dir, baseline_path)
+    manifest.refresh()
+    changes = manifest.changes()
+
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    os.makedirs(staging_dir)
+    for rel_path in changes.upload():
+        target_path = os.path.join(staging_dir, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        _ = shutil.copy2(os.path.join(dest_dir, *rel_path.split("/")), target_path)
+    with open(os.path.join(staging_dir, CHANGES_FILE_NAME), "w") as f:
+        json.dump({"added": changes.added, "modified": changes.modified, "deleted": changes.deleted}, f, indent=1)
+
+    # Staged files become the baseline for the next deploy
+    manifest.deployed = {rel_path: record["hash"] for rel_path, record in manifest.files.items()}
+    manifest.save(manifest_path)
+    manifest.save_baseline(baseline_path)
+    return changes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Copy only the outputs changed since the last deploy into a staging directory")
+    _ = parser.add_argument("staging", nargs="?", default="deploy", help="directory that receives the changed files and changes.json")
+    _ = parser.add_argument("--dest", default="docs", help="built site to deploy")
+    _ = parser.add_argument("--manifest", default=DEPLOY_MANIFEST_PATH, help="local cache of the output tree's hashes")
+    _ = parser.add_argument("--baseline", default=DEPLOY_BASELINE_PATH, help="hashes of the last deploy; commit it with the site")
+    _ = parser.add_argument("--dry-run", action="store_true", help="list the changes without staging them or moving the baseline")
+    args = parser.parse_args()
+
+    try:
+        if args.dry_run:
+            manifest = DeployManifest.load(args.manifest, args.dest, args.baseline)
+            manifest.refresh()
+            changes = manifest.changes()
+            for label, paths in (("added", changes.added), ("modified", changes.modified), ("deleted", changes.deleted)):
+                for rel_path in paths:
+                    print(f"{label} {rel_path}")
+        else:
+            changes = stage_changes(args.dest, args.staging, args.manifest, args.baseline)
+    except Exception as e:
+        print(f"Deploy staging failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{changes.summary()}" + ("" if args.dry_run else f"; staged into {args.staging}"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any
+
+from manifest import CACHE_DIR
+
+FRAGMENT_CACHE_PATH = os.path.join(CACHE_DIR, "fragments.sqlite")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Bump whenever block rendering changes so stale fragments are never served
+FRAGMENT_CACHE_VERSION = "1"
+MEMORY_ENTRIES = 10_000
+
+
+class FragmentCache:
+    def __init__(self, path: str = FRAGMENT_CACHE_PATH) -> None:
+        import sqlite3
+
+        self.path: str = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection: Any = sqlite3.connect(path, timeout=30)
+        _ = self.connection.execute("PRAGMA journal_mode=WAL")
+        _ = self.connection.execute("PRAGMA synchronous=NORMAL")
+        _ = self.connection.execute("CREATE TABLE IF NOT EXISTS fragments (key TEXT PRIMARY KEY, html BLOB NOT NULL, size INTEGER NOT NULL, last_used INTEGER NOT NULL)")
+        _ = self.connection.execute("CREATE INDEX IF NOT EXISTS fragments_last_used ON fragments (last_used)")
+        self.connection.commit()
+
+        self.stamp: int = time.time_ns()
+        # Blocks shared across pages, like footers, are served from memory after the first hit
+        self.memory: OrderedDict[str, str] = OrderedDict()
+        self.pending: dict[str, bytes] = {}
+        self.touched: set[str] = set()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def key(block_type: str, block: str, salt: str = "") -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        for part in (FRAGMENT_CACHE_VERSION, salt, block_type, block):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        html = self.memory.get(key)
+        if html is None:
+            row = self.connection.execute("SELECT html FROM fragments WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            html = zlib.decompress(row[0]).decode()
+            self.remember(key, html)
+        else:
+            self.memory.move_to_end(key)
+
+        self.hits += 1
+        self.touched.add(key)
+        return html
+
+    def remember(self, key: str, html: str) -> None:
+        self.memory[key] = html
+        if len(self.memory) > MEMORY_ENTRIES:
+            _ = self.memory.popitem(last=False)
+
+    def put(self, key: str, html: str) -> None:
+        self.remember(key, html)
+        self.pending[key] = zlib.compress(html.encode(), 1)
+
+    def flush(self) -> None:
+        if not self.pending and not self.touched:
+            return
+        _ = self.connection.executemany("INSERT OR REPLACE INTO fragments (key, html, size, last_used) VALUES (?, ?, ?, ?)",
+            [(key, data, len(data), self.stamp) for key, data in self.pending.items()])
+        _ = self.connection.executemany("UPDATE fragments SET last_used = ? WHERE key = ?", [(self.stamp, key) for key in self.touched])
+        self.connection.commit()
+        self.pending.clear()
+        self.touched.clear()
+
+    def total_bytes(self) -> int:
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM fragments").fetchone()[0]
+
+    def evict(self, max_bytes: int = DEFAULT_MAX_BYTES) -> int:
+        self.flush()
+        # Keep the most recently used fragments whose running size fits the budget
+        cursor = self.connection.execute("""
+            DELETE FROM fragments WHERE key IN (
+                SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running FROM fragments)
+                WHERE running > ?
+            )""", (max_bytes,))
+        self.connection.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+
+_open_caches: dict[str, FragmentCache] = {}
+
+def open_fragment_cache(path: str) -> FragmentCache:
+    # One connection per process, shared by every page that process renders
+    cache = _open_caches.get(path)
+    if cache is None:
+        cache = _open_caches[path] = FragmentCache(path)
+    return cache
@@ -1,39 +1,57 @@
-from typing import Any, override
-import unittest
+import io
+from collections.abc import Iterable
+from typing import Any, TextIO, override
 
 
 class HTMLNode:
-    def __init__(self, tag: str | None = None, value: str | None = None, children: list[HTMLNode] | None = [], props: dict[str, Any] = {}) -> None:
+    # Pages build thousands of nodes, so skip the per-instance __dict__
+    __slots__ = ("tag", "value", "children", "props")
+
+    def __init__(self, tag: str | None = None, value: str | None = None, children: list[HTMLNode] | None = None, props: dict[str, Any] | None = None) -> None:
         self.tag: str | None = tag
         self.value: str | None = value
         self.children: list[HTMLNode] | None = children
-        self.props: dict[str, Any] = props
+        self.props: dict[str, Any] = props if props is not None else {}
 
-    def to_html(self) -> str:
+    def write_html(self, stream: TextIO) -> None:
         raise NotImplementedError
 
+    def to_html(self) -> str:
+        buffer = io.StringIO()
+        self.write_html(buffer)
+        return buffer.getvalue()
+
     def props_to_html(self):
         return " ".join(map(lambda key: f"{key}=\"{self.props[key]}\"", self.props.keys()))
 
+    def open_tag(self) -> str:
+        return f'<{self.tag}{"" if not self.props else " "}{self.props_to_html()}>'
+
     @override
     def __repr__(self) -> str:
         return f'HTMLNode(\n\tTag: {self.tag}\n\tValue: {self.value}\n\tChildren: {self.children}\n\t Properties: {self.props}\n)'
 
 
 class LeafNode(HTMLNode):
-    def __init__(self, tag: str | None, value: str, props: dict[str, Any] = {}) -> None:
+    __slots__ = ()
+
+    def __init__(self, tag: str | None, value: str, props: dict[str, Any] | None = None) -> None:
         super().__init__(tag, value, None, props)
-    
+
     @override
-    def to_html(self) -> str:
+    def write_html(self, stream: TextIO) -> None:
         if self.tag == None:
-            return self.value if self.value != None else ""
-        return f'<{self.tag}{"" if not self.props else " "}{self.props_to_html()}>{self.value}</{self.tag}>'
+            if self.value != None:
+                _ = stream.write(self.value)
+            return
+        _ = stream.write(f'{self.open_tag()}{self.value}</{self.tag}>')
 
 
 class ParentNode(HTMLNode):
-    def __init__(self, tag: str, children: list[HTMLNode], props: dict[str, Any] = {}) -> None:
-        super().__init__(tag, None, children, props)
+    __slots__ = ()
+
+    def __init__(self, tag: str, children: list[HTMLNode] | None = None, props: dict[str, Any] | None = None) -> None:
+        super().__init__(tag, None, children if children is not None else [], props)
 
     def add_child(self, child: HTMLNode) -> ParentNode:
         assert (self.children is not None)
@@ -45,11 +63,38 @@ class ParentNode(HTMLNode):
         return self
 
     @override
-    def to_html(self) -> str:
+    def write_html(self, stream: TextIO) -> None:
         if self.tag == None:
             raise ValueError("No Tag Found in ParentNode")
         elif not self.children:
             raise ValueError("No Children in ParentNode")
-        return f'<{self.tag}{"" if not self.props else " "}{self.props_to_html()}>{"".join(map(lambda child: child.to_html(), self.children))}</{self.tag}>'
 
+        # Children write straight into the stream, so nothing is re-copied per nesting level
+        _ = stream.write(self.open_tag())
+        for child in self.children:
+            child.write_html(stream)
+        _ = stream.write(f'</{self.tag}>')
 
+
+class StreamingParentNode(HTMLNode):
+    __slots__ = ("pending_children",)
+
+    def __init__(self, tag: str, children: Iterable[HTMLNode], props: dict[str, Any] | None = None) -> None:
+        super().__init__(tag, None, None, props)
+        # Children are produced while writing, so the node can only be written once
+        self.pending_children: Iterable[HTMLNode] = children
+
+    @override
+    def write_html(self, stream: TextIO) -> None:
+        if self.tag == None:
+            raise ValueError("No Tag Found in ParentNode")
+
+        has_children = False
+        _ = stream.write(self.open_tag())
+        for child in self.pending_children:
+            child.write_html(stream)
+            has_children = True
+
+        if not has_children:
+            raise ValueError("No Children in ParentNode")
+        _ = stream.write(f'</{self.tag}>')
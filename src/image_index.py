@@ -0,0 +1,142 @@
+import json
+import os
+import struct
+from collections.abc import Iterable
+from typing import BinaryIO
+
+from htmlnode import HTMLNode
+from manifest import CACHE_DIR, atomic_write, hash_file
+from regexing import extract_markdown_images
+from site_index import scan_files
+from template import prefix_url
+
+IMAGE_INDEX_PATH = os.path.join(CACHE_DIR, "image_index.json")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+# Start-of-frame markers carry the dimensions; C4, C8 and CC share the range but are not frames
+JPEG_FRAME_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_STANDALONE_MARKERS = frozenset(range(0xD0, 0xDA)) | {0x01}
+
+
+def read_jpeg_size(f: BinaryIO) -> tuple[int, int] | None:
+    _ = f.seek(2)
+    while True:
+        if f.read(1) != b"\xff":
+            return None
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            return None
+
+        if marker[0] in JPEG_STANDALONE_MARKERS:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        if marker[0] in JPEG_FRAME_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return width, height
+        # Skip the segment body, so EXIF and ICC data are never read
+        _ = f.seek(struct.unpack(">H", length_bytes)[0] - 2, os.SEEK_CUR)
+
+
+def read_image_size(path: str) -> tuple[int, int] | None:
+    # Formats are sniffed from their signatures, since extensions are not always honest
+    with open(path, "rb") as f:
+        header = f.read(32)
+        if header.startswith(b"\x89PNG\r\n\x1a\n") and header[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", header[16:24])
+            return width, height
+        if header[:6] in (b"GIF87a", b"GIF89a"):
+            width, height = struct.unpack("<HH", header[6:10])
+            return width, height
+        if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+            chunk = header[12:16]
+            if chunk == b"VP8 " and header[23:26] == b"\x9d\x01\x2a":
+                width, height = struct.unpack("<HH", header[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L" and header[20] == 0x2F:
+                bits = struct.unpack("<I", header[21:25])[0]
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b"VP8X":
+                return int.from_bytes(header[24:27], "little") + 1, int.from_bytes(header[27:30], "little") + 1
+            return None
+        if header.startswith(b"\xff\xd8"):
+            return read_jpeg_size(f)
+    return None
+
+
+def image_urls(markdown: str) -> list[str]:
+    # Lines are joined the way the inline scanner joins them; a stray extra match only makes a
+    # signature more specific, never stale
+    return sorted({url for _, url in extract_markdown_images(markdown.replace("\n", " "))})
+
+def read_image_urls(source_path: str) -> list[str]:
+    with open(source_path, "r") as f:
+        return image_urls(f.read())
+
+
+class ImageIndex:
+    def __init__(self, sizes: dict[str, tuple[int, int]] | None = None, index_path: str = IMAGE_INDEX_PATH) -> None:
+        # Basepath-prefixed URL -> (width, height)
+        self.sizes: dict[str, tuple[int, int]] = sizes if sizes is not None else {}
+        # The cache this index was built with, so a rebuild updates the same one
+        self.index_path: str = index_path
+
+    def signature(self, urls: Iterable[str], basepath: str = "/") -> str:
+        # The sizes these markdown image URLs resolve to, so a key or record only changes with them
+        parts: list[str] = []
+        for url in urls:
+            size = self.sizes.get(prefix_url(url, basepath) or "")
+            parts.append(f"{url}={size[0]}x{size[1]}" if size is not None else f"{url}=-")
+        return ";".join(parts)
+
+    def changed_srcs(self, other: ImageIndex) -> set[str]:
+        return {src for src in self.sizes.keys() | other.sizes.keys() if self.sizes.get(src) != other.sizes.get(src)}
+
+    @staticmethod
+    def build(static_dir: str, basepath: str = "/", index_path: str = IMAGE_INDEX_PATH) -> ImageIndex:
+        try:
+            with open(index_path, "r") as f:
+                old_records: dict[str, dict[str, int | str]] = json.load(f)
+        except (OSError, ValueError):
+            old_records = {}
+
+        records: dict[str, dict[str, int | str]] = {}
+        sizes: dict[str, tuple[int, int]] = {}
+        for entry in scan_files(static_dir):
+            if os.path.splitext(entry.rel_path)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+
+            # Unchanged stat skips the read, and an unchanged hash skips the header parse
+            record = old_records.get(entry.rel_path)
+            if record is None or record["mtime_ns"] != entry.mtime_ns or record["size"] != entry.size:
+                file_hash = hash_file(entry.path)
+                if record is None or record["hash"] != file_hash:
+                    size = read_image_size(entry.path)
+                    record = {"hash": file_hash, "width": size[0], "height": size[1]} if size is not None else {"hash": file_hash}
+                record = dict(record, mtime_ns=entry.mtime_ns, size=entry.size)
+
+            records[entry.rel_path] = record
+            if "width" in record:
+                sizes[basepath + entry.rel_path] = (int(record["width"]), int(record["height"]))
+
+        if records != old_records:
+            os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+            atomic_write(index_path, json.dumps(records, indent=1, sort_keys=True))
+
+        return ImageIndex(sizes, index_path)
+
+    def add_sizes(self, node: HTMLNode) -> None:
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.tag == "img" and "width" not in current.props:
+                size = self.sizes.get(current.props.get("src"))
+                if size is not None:
+                    current.props["width"], current.props["height"] = size
+            if current.children:
+                stack.extend(current.children)
@@ -0,0 +1,98 @@
+import os
+import posixpath
+import re
+from collections.abc import Iterable
+
+from htmlnode import HTMLNode
+from site_index import SiteIndex, scan_files
+
+# (source line, "link" or "image", target as written into the page)
+LinkRef = tuple[int, str, str]
+FRAGMENT_REF = re.compile(r'<(a|img) [^>]*?\b(?:href|src)="([^"]*)"')
+EXTERNAL_TARGET = re.compile(r"^(?:[A-Za-z][A-Za-z0-9+.-]*:|//)")
+REF_KINDS = {"a": "link", "img": "image"}
+
+
+def node_refs(node: HTMLNode) -> list[tuple[str, str]]:
+    found: list[tuple[str, str]] = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.tag == "a" and "href" in current.props:
+            found.append(("link", current.props["href"]))
+        elif current.tag == "img" and "src" in current.props:
+            found.append(("image", current.props["src"]))
+        if current.children:
+            stack.extend(reversed(current.children))
+    return found
+
+
+def fragment_refs(html: str) -> list[tuple[str, str]]:
+    # Cached fragments have no node tree left, but their markup is still only this block
+    return [(REF_KINDS[match.group(1)], match.group(2)) for match in FRAGMENT_REF.finditer(html)]
+
+
+def record_refs(refs: list[LinkRef], found: list[tuple[str, str]], lines: list[str], first_line: int, basepath: str) -> None:
+    cursor = 0
+    for kind, target in found:
+        # Targets were prefixed with the basepath while rendering; the source still has the bare path
+        written = "/" + target[len(basepath):] if basepath != "/" and target.startswith(basepath) else target
+        cursor = next((i for i in range(cursor, len(lines)) if written in lines[i]), cursor)
+        refs.append((first_line + cursor, kind, target))
+
+
+class LinkIndex:
+    def __init__(self, urls: set[str]) -> None:
+        self.urls: set[str] = urls
+
+    @staticmethod
+    def build(site: SiteIndex, static_dir: str, basepath: str = "/", extra_outputs: Iterable[str] = ()) -> LinkIndex:
+        urls: set[str] = set()
+        # Generated pages that have no markdown source, like section listings
+        for output_path in [page.output_path for page in site.pages] + list(extra_outputs):
+            rel_path = os.path.relpath(output_path, site.dest_dir).replace(os.sep, "/")
+            urls.add(basepath + rel_path)
+            # Static hosts serve index.html for its directory and page.html for /page
+            if rel_path == "index.html" or rel_path.endswith("/index.html"):
+                directory = basepath + rel_path.removesuffix("index.html")
+                urls.update((directory, directory.rstrip("/") or "/"))
+            else:
+                urls.add(basepath + rel_path.removesuffix(".html"))
+        for entry in scan_files(static_dir):
+            urls.add(basepath + entry.rel_path)
+        return LinkIndex(urls)
+
+    def resolve(self, target: str, page_url: str) -> bool | None:
+        # None means the target is not ours to check: external, mail, or a same-page anchor
+        if not target or target.startswith("#") or EXTERNAL_TARGET.match(target):
+            return None
+        path = target.split("#", 1)[0].split("?", 1)[0]
+        if "%" in path:
+            from urllib.parse import unquote
+
+            path = unquote(path)
+        if not path.startswith("/"):
+            path = posixpath.normpath(posixpath.join(posixpath.dirname(page_url), path))
+        return path in self.urls or path.rstrip("/") in self.urls
+
+
+class BrokenRef:
+    def __init__(self, source_path: str, line: int, kind: str, target: str) -> None:
+        self.source_path: str = source_path
+        self.line: int = line
+        self.kind: str = kind
+        self.target: str = target
+
+    def describe(self) -> str:
+        return f"{self.source_path}:{self.line}: broken {self.kind} {self.target}"
+
+
+def check_links(refs: dict[str, list[LinkRef]], site: SiteIndex, static_dir: str = "static", basepath: str = "/", extra_outputs: Iterable[str] = ()) -> list[BrokenRef]:
+    index = LinkIndex.build(site, static_dir, basepath, extra_outputs)
+    broken: list[BrokenRef] = []
+    for page in site.pages:
+        page_url = basepath + os.path.relpath(page.output_path, site.dest_dir).replace(os.sep, "/")
+        for line, kind, target in refs.get(page.source_path, []):
+            if index.resolve(target, page_url) is False:
+                broken.append(BrokenRef(page.source_path, line, kind, target))
+    return broken
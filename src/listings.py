@@ -0,0 +1,136 @@
+import json
+import os
+import posixpath
+import re
+
+from htmlnode import HTMLNode, LeafNode, ParentNode
+from manifest import CACHE_DIR, atomic_write, remove_empty_dirs
+from metadata import PageMeta, SiteMetadata
+from page_generation import write_page
+from search_index import page_url
+from site_index import SiteIndex
+from template import load_template
+
+LISTINGS_STATE_PATH = os.path.join(CACHE_DIR, "listings.json")
+SECTION_LISTING_DIR = "pages"
+TAG_LISTING_DIR = "tags"
+DEFAULT_PAGE_SIZE = 10
+NON_SLUG = re.compile(r"[^\w]+")
+
+
+class Listing:
+    def __init__(self, title: str, rel_dir: str, entries: list[PageMeta]) -> None:
+        self.title: str = title
+        # Output directory relative to the destination, "/"-separated
+        self.rel_dir: str = rel_dir
+        self.entries: list[PageMeta] = entries
+
+    def page_dir(self, number: int) -> str:
+        return self.rel_dir if number == 1 else f"{self.rel_dir}/{number}"
+
+
+class ListingResult:
+    def __init__(self) -> None:
+        self.written: list[str] = []
+        self.removed: list[str] = []
+
+
+def section_of(rel_path: str) -> str | None:
+    directory = posixpath.dirname(rel_path)
+    if posixpath.basename(rel_path) != "index.md":
+        return directory
+    # A directory's index page stands for the directory, so it is listed in the parent section
+    return posixpath.dirname(directory) if directory else None
+
+def tag_slug(tag: str) -> str:
+    return NON_SLUG.sub("-", tag.lower()).strip("-")
+
+def sort_entries(entries: list[PageMeta]) -> list[PageMeta]:
+    # Explicit order first, then newest first, then by title; each sort is stable
+    entries = sorted(entries, key=lambda meta: meta.title.lower())
+    entries.sort(key=lambda meta: meta.date, reverse=True)
+    entries.sort(key=lambda meta: (meta.order is None, meta.order or 0))
+    return entries
+
+def collect_listings(metadata: SiteMetadata) -> list[Listing]:
+    titles = {meta.rel_path: meta.title for meta in metadata.pages}
+    sections: dict[str, list[PageMeta]] = {}
+    tags: dict[str, tuple[str, list[PageMeta]]] = {}
+    for meta in metadata.pages:
+        section = section_of(meta.rel_path)
+        if section is not None:
+            sections.setdefault(section, []).append(meta)
+        for tag in meta.tags:
+            if tag_slug(tag):
+                tags.setdefault(tag_slug(tag), (tag, []))[1].append(meta)
+
+    listings: list[Listing] = []
+    for section, entries in sorted(sections.items()):
+        title = titles.get(posixpath.join(section, "index.md"), section or "Pages")
+        listings.append(Listing(title, posixpath.join(section, SECTION_LISTING_DIR), sort_entries(entries)))
+    for slug, (tag, entries) in sorted(tags.items()):
+        listings.append(Listing(f"Tagged {tag}", f"{TAG_LISTING_DIR}/{slug}", sort_entries(entries)))
+    return listings
+
+def listing_node(listing: Listing, entries: list[PageMeta], number: int, count: int, basepath: str) -> HTMLNode:
+    items: list[HTMLNode] = []
+    for meta in entries:
+        # Titles are written as-is, like on the page itself and in its <title>
+        item = ParentNode("li", [LeafNode("a", meta.title, {"href": page_url(meta.rel_path.removesuffix(".md") + ".html", basepath)})])
+        if meta.date:
+            _ = item.add_child(LeafNode("time", meta.date))
+        items.append(item)
+
+    children: list[HTMLNode] = [LeafNode("h1", listing.title), ParentNode("ul", items)]
+    if count > 1:
+        nav = ParentNode("nav", [])
+        if number > 1:
+            _ = nav.add_child(LeafNode("a", "Previous", {"href": f"{basepath}{listing.page_dir(number - 1)}/", "rel": "prev"}))
+        _ = nav.add_child(LeafNode("span", f"Page {number} of {count}"))
+        if number < count:
+            _ = nav.add_child(LeafNode("a", "Next", {"href": f"{basepath}{listing.page_dir(number + 1)}/", "rel": "next"}))
+        children.append(nav)
+    return ParentNode("div", children)
+
+def load_listing_state(state_path: str, dest_dir: str) -> list[str]:
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return state["outputs"] if state.get("dest_dir") == dest_dir else []
+
+def build_listings(metadata: SiteMetadata, site: SiteIndex, template_path: str, basepath: str = "/", page_size: int = DEFAULT_PAGE_SIZE, minify: bool = False, state_path: str = LISTINGS_STATE_PATH) -> ListingResult:
+    if page_size < 1:
+        raise Exception(f"Listing page size must be at least 1, got {page_size}")
+
+    # Work out every output first, so a collision with a content page leaves the tree untouched
+    page_outputs = {page.output_path: page.source_path for page in site.pages}
+    planned: list[tuple[str, Listing, int, int]] = []
+    for listing in collect_listings(metadata):
+        count = (len(listing.entries) + page_size - 1) // page_size
+        for number in range(1, count + 1):
+            dest_path = os.path.join(site.dest_dir, *listing.page_dir(number).split("/"), "index.html")
+            if dest_path in page_outputs:
+                raise Exception(f"Listing {dest_path} would overwrite the page generated from {page_outputs[dest_path]}")
+            planned.append((dest_path, listing, number, count))
+
+    result = ListingResult()
+    template = load_template(template_path, basepath)
+    for dest_path, listing, number, count in planned:
+        entries = listing.entries[(number - 1) * page_size:number * page_size]
+        title = listing.title if number == 1 else f"{listing.title} (page {number})"
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        write_page(dest_path, template, title, listing_node(listing, entries, number, count, basepath), minify)
+        result.written.append(dest_path)
+
+    written = set(result.written)
+    for dest_path in load_listing_state(state_path, site.dest_dir):
+        if dest_path not in written and dest_path not in page_outputs and os.path.exists(dest_path):
+            os.remove(dest_path)
+            remove_empty_dirs(os.path.dirname(dest_path), site.dest_dir)
+            result.removed.append(dest_path)
+
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    atomic_write(state_path, json.dumps({"dest_dir": site.dest_dir, "outputs": result.written}))
+    return result
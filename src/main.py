@@ -1,19 +1,165 @@
+import argparse
+import os
+import shutil
 import sys
-from statics import copy_static_to_dir
-from page_generation import generate_page, generate_pages_recursive
+from statics import COMPARE_MODES, PLACEMENT_MODES, STATIC_MANIFEST_PATH, copy_static_to_dir, sync_static_to_dir
+from manifest import MANIFEST_PATH, discard_state
+from buildlog import configure_logging, logger
+from page_generation import RenderOptions, generate_pages_parallel, generate_pages_incremental
+from site_index import SiteIndex, parse_shard
 
 def main() -> None:
-    print(sys.argv)
-    basepath = sys.argv[1] if len(sys.argv) > 1 else "/"
+    parser = argparse.ArgumentParser(description="Build the site from content/ into docs/")
+    _ = parser.add_argument("basepath", nargs="?", default="/")
+    _ = parser.add_argument("--incremental", action="store_true", help="only re-render pages whose source, template or basepath changed")
+    _ = parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes used to render pages")
+    _ = parser.add_argument("--static-compare", choices=COMPARE_MODES, default="mtime", help="how --incremental decides a static asset changed")
+    _ = parser.add_argument("--static-placement", choices=PLACEMENT_MODES, default="copy", help="how --incremental places changed static assets, falling back to copy")
+    _ = parser.add_argument("--watch", action="store_true", help="build incrementally, then rebuild on changes and serve with live reload")
+    _ = parser.add_argument("--port", type=int, default=8888, help="port for --watch")
+    _ = parser.add_argument("--pipeline", type=int, default=0, metavar="N", help="render in one process while N threads read ahead and write behind; holds up to N whole sources and N rendered pages in memory, so prefer the default streaming build for very large pages")
+    _ = parser.add_argument("--fragment-cache", action="store_true", help="reuse rendered HTML for unchanged blocks across pages and builds")
+    _ = parser.add_argument("--fragment-cache-mb", type=int, default=64, help="size limit of the on-disk fragment cache")
+    _ = parser.add_argument("--profile", metavar="REPORT", help="time each build stage and page and write the report here (renders pages with one job; post-build stages keep --jobs)")
+    _ = parser.add_argument("--profile-format", choices=("json", "chrome"), default="json", help="summary JSON or a Chrome trace for chrome://tracing")
+    _ = parser.add_argument("--minify", action="store_true", help="strip collapsible whitespace and comments from pages and stylesheets")
+    _ = parser.add_argument("--no-image-sizes", action="store_true", help="do not add width/height read from the image headers to <img> tags")
+    _ = parser.add_argument("--search-index", action="store_true", help="write a prefix-sharded full-text index under docs/search/, updated for changed pages only")
+    _ = parser.add_argument("--fingerprint", action="store_true", help="also publish CSS and images under content-hashed names and point pages at them")
+    _ = parser.add_argument("--precompress", action="store_true", help="write .gz (and .br if brotli is installed) siblings for text outputs")
+    _ = parser.add_argument("--listings", action="store_true", help="generate paginated listings under <section>/pages/ and tags/<tag>/ from page titles and front matter")
+    _ = parser.add_argument("--listing-page-size", type=int, default=10, metavar="N", help="entries per listing page")
+    _ = parser.add_argument("--check-links", action="store_true", help="report internal links and images that point at no generated page or static asset")
+    _ = parser.add_argument("--strict-links", action="store_true", help="like --check-links, but fail the build on a broken target")
+    _ = parser.add_argument("--deploy-manifest", action="store_true", help="hash every output and record what changed since the last src/deploy.py staging")
+    _ = parser.add_argument("--shard", type=parse_shard, metavar="i/N", help="render only slice i of N into docs-shard-i-of-N, to be combined with src/merge.py")
+    _ = parser.add_argument("-v", "--verbose", action="store_true", help="log every page as it is generated")
+    args = parser.parse_args()
+    if args.shard is not None and (args.incremental or args.watch or args.fingerprint or args.precompress or args.search_index or args.listings or args.deploy_manifest):
+        parser.error("--shard only renders pages; run the other stages on the merged tree")
+    if args.pipeline > 0 and args.jobs > 1:
+        parser.error("--pipeline overlaps I/O within one process; use it instead of --jobs")
 
-    if not basepath.startswith("/"): 
+    if args.verbose:
+        configure_logging(args.verbose)
+
+    basepath: str = args.basepath
+
+    if not basepath.startswith("/"):
         basepath = "/" + basepath
-    if not basepath.endswith("/"): 
+    if not basepath.endswith("/"):
         basepath += "/"
 
     target_path = "docs"
 
-    copy_static_to_dir(target_path)
-    generate_pages_recursive("content", "template.html", target_path, basepath)
-    
-main()
+    options = RenderOptions(minify=args.minify, pipeline=args.pipeline, check_links=args.check_links or args.strict_links)
+    if not args.no_image_sizes:
+        from image_index import ImageIndex
+
+        options.images = ImageIndex.build("static", basepath)
+    if args.fragment_cache:
+        from fragment_cache import FRAGMENT_CACHE_PATH
+
+        options.fragment_cache_path = FRAGMENT_CACHE_PATH
+
+    # Page rendering only; post-build stages keep --jobs
+    render_jobs: int = args.jobs
+    profiler = None
+    if args.profile:
+        from profiling import Profiler
+
+        # Worker processes would not report back and the pipeline skips generate_page, so profiled builds render page by page
+        render_jobs = 1
+        options.pipeline = 0
+        profiler = Profiler()
+        profiler.install()
+
+    if args.shard is not None or not (args.incremental or args.watch):
+        # These builds rewrite pages and assets behind the incremental records, which would then
+        # describe another build and let the next --incremental or --watch run keep its stale outputs
+        discard_state(MANIFEST_PATH)
+        discard_state(STATIC_MANIFEST_PATH)
+    if args.shard is not None:
+        from merge import shard_dir, write_shard_manifest
+
+        # Each shard owns a fresh directory of pages only; static assets are added by the merge
+        shard_index, shard_count = args.shard
+        target_path = shard_dir(target_path, shard_index, shard_count)
+        if os.path.exists(target_path):
+            shutil.rmtree(target_path)
+        os.makedirs(target_path)
+        site = SiteIndex.build("content", target_path)
+        shard = site.shard(shard_index, shard_count)
+        result = generate_pages_parallel("content", "template.html", target_path, basepath, render_jobs, options, shard)
+        write_shard_manifest(site, shard, shard_index, shard_count, {source_path for source_path, _ in result.errors})
+    elif args.incremental or args.watch:
+        _ = sync_static_to_dir(target_path, "static", args.static_compare, args.static_placement, minify=args.minify)
+        site = SiteIndex.build("content", target_path)
+        result = generate_pages_incremental("content", "template.html", target_path, basepath, jobs=render_jobs, options=options, site=site)
+    else:
+        copy_static_to_dir(target_path, minify=args.minify)
+        site = SiteIndex.build("content", target_path)
+        result = generate_pages_parallel("content", "template.html", target_path, basepath, render_jobs, options, site)
+
+    listing_outputs: list[str] = []
+    if args.listings:
+        from listings import build_listings
+        from metadata import SiteMetadata
+
+        # Built from titles and front matter alone; no page body is read for this
+        try:
+            listing_outputs = build_listings(SiteMetadata.build(site), site, "template.html", basepath, args.listing_page_size, args.minify).written
+        except Exception as e:
+            result.errors.append(("listings", f"{type(e).__name__}: {e}"))
+
+    broken_links = 0
+    if options.check_links:
+        from link_check import check_links
+
+        # Targets were recorded while rendering, so this is one set lookup per link and no HTML is reread
+        for broken in check_links(result.refs, site, "static", basepath, listing_outputs):
+            logger.error("%s", broken.describe())
+            broken_links += 1
+
+    if args.search_index:
+        from search_index import build_search_index
+
+        _ = build_search_index("content", target_path, basepath, site=site)
+
+    if args.fingerprint or args.precompress:
+        from postbuild import post_build
+
+        _ = post_build(target_path, "static", basepath, args.fingerprint, args.precompress, args.jobs)
+
+    if args.deploy_manifest:
+        from deploy import update_deploy_manifest
+
+        # Last, so the hashes cover fingerprinted and compressed outputs too
+        changes = update_deploy_manifest(target_path)
+        print(f"Deploy changes: {changes.summary()}")
+
+    if options.fragment_cache_path is not None:
+        from fragment_cache import open_fragment_cache
+
+        _ = open_fragment_cache(options.fragment_cache_path).evict(args.fragment_cache_mb * 1024 * 1024)
+
+    if profiler is not None:
+        profiler.uninstall()
+        profiler.save(args.profile, args.profile_format)
+        profiler.print_summary()
+
+    if args.watch:
+        from serve import SiteWatcher, serve
+
+        result.report_errors()
+        serve(SiteWatcher("content", "static", "template.html", target_path, basepath, options), args.port)
+        return
+
+    if result.errors:
+        result.report_errors()
+        sys.exit(1)
+    if args.strict_links and broken_links:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+CACHE_DIR = ".ssg_cache"
+MANIFEST_PATH = os.path.join(CACHE_DIR, "manifest.json")
+MANIFEST_VERSION = 2
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 16):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    # Yields a sibling temp path and renames it over path once filled, so an interrupted build
+    # never leaves a torn file; the pid keeps concurrent processes off each other's temp files
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+def atomic_write(path: str, data: str | bytes) -> None:
+    with atomic_path(path) as tmp_path:
+        if isinstance(data, bytes):
+            with open(tmp_path, "wb") as f:
+                _ = f.write(data)
+        else:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                _ = f.write(data)
+
+def discard_state(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+def remove_empty_dirs(path: str, stop_dir: str):
+    while os.path.abspath(path) != os.path.abspath(stop_dir) and os.path.isdir(path) and not os.listdir(path):
+        os.rmdir(path)
+        path = os.path.dirname(path)
+
+
+class BuildManifest:
+    def __init__(self, template_hash: str = "", basepath: str = "", dest_dir: str = "", pages: dict[str, dict[str, Any]] | None = None, settings: dict[str, Any] | None = None) -> None:
+        self.template_hash: str = template_hash
+        self.basepath: str = basepath
+        self.dest_dir: str = dest_dir
+        # Render options that change the bytes of every page, like minification
+        self.settings: dict[str, Any] = settings if settings is not None else {}
+        # source path -> {"hash": source hash, "output": output path, "mtime_ns" and "size": source stat}
+        self.pages: dict[str, dict[str, Any]] = pages if pages is not None else {}
+
+    def matches_build(self, template_hash: str, basepath: str, dest_dir: str, settings: dict[str, Any] | None = None) -> bool:
+        return self.template_hash == template_hash and self.basepath == basepath and self.dest_dir == dest_dir \
+            and self.settings == (settings if settings is not None else {})
+
+    @staticmethod
+    def load(path: str = MANIFEST_PATH) -> BuildManifest:
+        try:
+            with open(path, "r") as f:
+                data: dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            return BuildManifest()
+
+        if data.get("version") != MANIFEST_VERSION:
+            return BuildManifest()
+
+        return BuildManifest(data["template_hash"], data["basepath"], data["dest_dir"], data["pages"], data["settings"])
+
+    def save(self, path: str = MANIFEST_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "template_hash": self.template_hash,
+            "basepath": self.basepath,
+            "dest_dir": self.dest_dir,
+            "pages": self.pages,
+            "settings": self.settings,
+        }
+        atomic_write(path, json.dumps(data, indent=1, sort_keys=True))
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+
+from manifest import MANIFEST_PATH, atomic_write, discard_state
+from site_index import SiteIndex, scan_files
+from statics import STATIC_MANIFEST_PATH, copy_static_to_dir
+
+SHARD_MANIFEST_NAME = ".shard.json"
+
+
+def shard_dir(target_dir: str, index: int, count: int) -> str:
+    return f"{target_dir}-shard-{index}-of-{count}"
+
+
+class ShardManifest:
+    def __init__(self, index: int, count: int, site_digest: str, site_pages: int, pages: list[str]) -> None:
+        self.index: int = index
+        self.count: int = count
+        # Every shard walks the whole tree, so these must agree across shards of one build
+        self.site_digest: str = site_digest
+        self.site_pages: int = site_pages
+        # Output paths relative to the shard directory, only for pages that rendered
+        self.pages: list[str] = pages
+
+    @staticmethod
+    def load(shard_path: str) -> ShardManifest:
+        with open(os.path.join(shard_path, SHARD_MANIFEST_NAME), "r") as f:
+            data = json.load(f)
+        return ShardManifest(data["index"], data["count"], data["site_digest"], data["site_pages"], data["pages"])
+
+    def save(self, shard_path: str) -> None:
+        data = {
+            "index": self.index,
+            "count": self.count,
+            "site_digest": self.site_digest,
+            "site_pages": self.site_pages,
+            "pages": self.pages,
+        }
+        # Its presence marks a finished shard, so it must never be seen half-written
+        atomic_write(os.path.join(shard_path, SHARD_MANIFEST_NAME), json.dumps(data, indent=1))
+
+
+def write_shard_manifest(site: SiteIndex, shard: SiteIndex, index: int, count: int, failed: set[str]) -> None:
+    pages = [os.path.relpath(page.output_path, shard.dest_dir) for page in shard.pages if page.source_path not in failed]
+    ShardManifest(index, count, site.digest(), len(site.pages), pages).save(shard.dest_dir)
+
+
+def verify_shards(shard_paths: list[str]) -> list[ShardManifest]:
+    if not shard_paths:
+        raise Exception("No shards to merge")
+
+    manifests: list[ShardManifest] = []
+    for shard_path in shard_paths:
+        try:
+            manifests.append(ShardManifest.load(shard_path))
+        except (OSError, ValueError, KeyError) as e:
+            raise Exception(f"{shard_path} is not a finished shard: {e}")
+
+    first = manifests[0]
+    for shard_path, manifest in zip(shard_paths, manifests):
+        if manifest.count != first.count or manifest.site_digest != first.site_digest:
+            raise Exception(f"{shard_path} was built from a different content tree or shard count")
+
+    indexes = sorted(manifest.index for manifest in manifests)
+    if indexes != list(range(first.count)):
+        raise Exception(f"Expected shards 0 to {first.count - 1} exactly once, got {indexes}")
+
+    owners: dict[str, str] = {}
+    for shard_path, manifest in zip(shard_paths, manifests):
+        for page in manifest.pages:
+            if page in owners:
+                raise Exception(f"{page} was rendered by both {owners[page]} and {shard_path}")
+            owners[page] = shard_path
+            if not os.path.isfile(os.path.join(shard_path, page)):
+                raise Exception(f"{page} is listed by {shard_path} but missing from it")
+
+    if len(owners) != first.site_pages:
+        raise Exception(f"Shards hold {len(owners)} of {first.site_pages} pages; rebuild the shards that reported errors")
+
+    return manifests
+
+
+def merge_shards(shard_paths: list[str], dest_dir: str, static_dir: str = "static", minify: bool = False) -> int:
+    manifests = verify_shards(shard_paths)
+
+    assets = {entry.rel_path for entry in scan_files(static_dir)}
+    for shard_path, manifest in zip(shard_paths, manifests):
+        for page in manifest.pages:
+            if page.replace(os.sep, "/") in assets:
+                raise Exception(f"{page} from {shard_path} would overwrite a static asset")
+
+    # Only touch the destination once every check has passed
+    copy_static_to_dir(dest_dir, True, minify, static_dir)
+
+    merged = 0
+    for shard_path, manifest in zip(shard_paths, manifests):
+        for page in manifest.pages:
+            target_path = os.path.join(dest_dir, page)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            _ = shutil.copy2(os.path.join(shard_path, page), target_path)
+            merged += 1
+    return merged
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Combine the outputs of main.py --shard i/N into one site")
+    _ = parser.add_argument("shards", nargs="+", help="shard output directories, e.g. docs-shard-0-of-4")
+    _ = parser.add_argument("--dest", default="docs", help="directory the merged site is written to")
+    _ = parser.add_argument("--static", default="static", help="static assets copied under the merged pages")
+    _ = parser.add_argument("--minify", action="store_true", help="minify stylesheets, matching shards built with --minify")
+    args = parser.parse_args()
+
+    try:
+        merged = merge_shards(args.shards, args.dest, args.static, args.minify)
+        # The merged tree replaces whatever the incremental records describe
+        discard_state(MANIFEST_PATH)
+        discard_state(STATIC_MANIFEST_PATH)
+    except Exception as e:
+        print(f"Merge failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Merged {merged} pages from {len(args.shards)} shards into {args.dest}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import json
+import os
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from manifest import CACHE_DIR, atomic_write
+from site_index import SiteIndex
+
+METADATA_CACHE_PATH = os.path.join(CACHE_DIR, "metadata.json")
+METADATA_VERSION = 1
+FRONT_MATTER_FENCE = "---"
+
+
+class PageHead:
+    def __init__(self, fields: dict[str, str], title: str | None, body_start: int) -> None:
+        # Raw "key: value" pairs from the front matter, keys lowercased
+        self.fields: dict[str, str] = fields
+        self.title: str | None = title
+        # Index of the first line after the front matter, 0 when there is none
+        self.body_start: int = body_start
+
+
+def read_page_head(lines: Iterable[str]) -> PageHead:
+    # Stops at the first heading, or right after the front matter when it names the title. An
+    # opening fence that is never closed was a horizontal rule, so the page has no front matter
+    fields: dict[str, str] = {}
+    body_start = 0
+    in_front_matter = False
+    # The heading a page opening with a horizontal rule would have had, should no closing fence follow
+    fallback_title: str | None = None
+    for number, line in enumerate(lines):
+        if number == 0 and line.rstrip() == FRONT_MATTER_FENCE:
+            in_front_matter = True
+        elif in_front_matter:
+            if fallback_title is None and line.startswith("# "):
+                fallback_title = line[2:].strip()
+            if line.rstrip() == FRONT_MATTER_FENCE:
+                in_front_matter = False
+                body_start = number + 1
+                if fields.get("title"):
+                    return PageHead(fields, fields["title"], body_start)
+            else:
+                key, separator, value = line.partition(":")
+                if separator and key.strip():
+                    fields[key.strip().lower()] = value.strip()
+        elif line.startswith("# "):
+            return PageHead(fields, line[2:].strip(), body_start)
+
+    if in_front_matter:
+        return PageHead({}, fallback_title, 0)
+    return PageHead(fields, fields.get("title"), body_start)
+
+def blank_front_matter(lines: Iterable[str], body_start: int) -> Iterator[str]:
+    # Blank lines keep the body's line numbers while making sure the front matter never renders
+    for number, line in enumerate(lines):
+        yield "" if number < body_start else line
+
+def parse_tags(value: str) -> list[str]:
+    value = value.strip().removeprefix("[").removesuffix("]")
+    return [tag.strip().strip("\"'") for tag in value.split(",") if tag.strip().strip("\"'")]
+
+
+class PageMeta:
+    def __init__(self, rel_path: str, title: str, date: str = "", tags: list[str] | None = None, order: int | None = None) -> None:
+        self.rel_path: str = rel_path
+        self.title: str = title
+        # Kept as written; ISO dates sort correctly as strings
+        self.date: str = date
+        self.tags: list[str] = tags if tags is not None else []
+        self.order: int | None = order
+
+    @staticmethod
+    def from_head(rel_path: str, head: PageHead) -> PageMeta:
+        order = head.fields.get("order")
+        try:
+            order_value = int(order) if order else None
+        except ValueError:
+            raise Exception(f"order must be a whole number, got {order!r}")
+        return PageMeta(rel_path, head.title or rel_path, head.fields.get("date", ""), parse_tags(head.fields.get("tags", "")), order_value)
+
+    def to_record(self) -> dict[str, Any]:
+        return {"title": self.title, "date": self.date, "tags": self.tags, "order": self.order}
+
+
+def read_page_meta(source_path: str, rel_path: str) -> PageMeta:
+    with open(source_path, "r") as f:
+        return PageMeta.from_head(rel_path, read_page_head(f))
+
+
+class SiteMetadata:
+    def __init__(self, pages: list[PageMeta]) -> None:
+        # In SiteIndex order
+        self.pages: list[PageMeta] = pages
+
+    @staticmethod
+    def build(site: SiteIndex, cache_path: str = METADATA_CACHE_PATH) -> SiteMetadata:
+        try:
+            with open(cache_path, "r") as f:
+                cache: dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        old_records: dict[str, dict[str, Any]] = cache.get("pages", {}) if cache.get("version") == METADATA_VERSION else {}
+
+        # Only pages whose stat changed are opened, and then only up to their title
+        pages: list[PageMeta] = []
+        records: dict[str, dict[str, Any]] = {}
+        for page in site.pages:
+            record = old_records.get(page.rel_path)
+            if record is not None and record["mtime_ns"] == page.mtime_ns and record["size"] == page.size:
+                meta = PageMeta(page.rel_path, record["title"], record["date"], record["tags"], record["order"])
+            else:
+                try:
+                    meta = read_page_meta(page.source_path, page.rel_path)
+                except Exception as e:
+                    raise Exception(f"{page.source_path}: {e}")
+            pages.append(meta)
+            records[page.rel_path] = dict(meta.to_record(), mtime_ns=page.mtime_ns, size=page.size)
+
+        if records != old_records:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            atomic_write(cache_path, json.dumps({"version": METADATA_VERSION, "pages": records}))
+        return SiteMetadata(pages)
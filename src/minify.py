@@ -0,0 +1,157 @@
+import io
+import os
+import re
+from typing import TextIO, override
+
+from manifest import CACHE_DIR, atomic_write, hash_file
+
+MINIFIED_CSS_DIR = os.path.join(CACHE_DIR, "minified")
+HTML_WHITESPACE = re.compile(r"[ \t\n\r\f]+")
+HTML_TAG = re.compile(r"""<[^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*>""")
+TAG_NAME = re.compile(r"</?([A-Za-z][A-Za-z0-9]*)")
+# Whitespace next to these never renders, so it can be dropped instead of collapsed to a space
+BLOCK_TAGS = frozenset((
+    "html", "head", "body", "title", "meta", "link", "script", "style", "article", "section", "header", "footer",
+    "nav", "main", "div", "p", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "blockquote", "pre", "hr", "br",
+    "table", "thead", "tbody", "tr", "td", "th",
+))
+RAW_TAGS = frozenset(("pre", "textarea", "script", "style"))
+CSS_TOKEN = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|(\s+)|([{};:,>()!]|[^"'/\s{};:,>()!]+|/)""", re.S)
+CSS_NO_SPACE_AFTER = frozenset("{};:,>(")
+CSS_NO_SPACE_BEFORE = frozenset("{};,>)!")
+
+
+class MinifyingWriter(io.TextIOBase):
+    def __init__(self, stream: TextIO) -> None:
+        super().__init__()
+        self.stream: TextIO = stream
+        # Markup split across writes waits here until it is complete
+        self.buffer: str = ""
+        self.raw_close: re.Pattern[str] | None = None
+        self.pending_space: bool = False
+        self.after_block: bool = True
+
+    @override
+    def writable(self) -> bool:
+        return True
+
+    @override
+    def write(self, text: str) -> int:
+        self.buffer += text
+        self.process()
+        return len(text)
+
+    @override
+    def close(self) -> None:
+        if not self.closed:
+            _ = self.stream.write(self.buffer)
+            self.buffer = ""
+        super().close()
+
+    def process(self) -> None:
+        buffer = self.buffer
+        position = 0
+        out: list[str] = []
+
+        while position < len(buffer):
+            if self.raw_close is not None:
+                # <pre>, <textarea>, <script> and <style> bodies pass through byte for byte
+                match = self.raw_close.search(buffer, position)
+                if match is None:
+                    safe = max(position, len(buffer) - len(self.raw_close.pattern))
+                    out.append(buffer[position:safe])
+                    position = safe
+                    break
+                out.append(buffer[position:match.start()])
+                position = match.start()
+                self.raw_close = None
+                continue
+
+            if buffer[position] == "<":
+                if buffer.startswith("<!--", position):
+                    end = buffer.find("-->", position + 4)
+                    if end == -1:
+                        break
+                    position = end + 3
+                    continue
+                if "<!--".startswith(buffer[position:position + 4]):
+                    break
+
+                match = HTML_TAG.match(buffer, position)
+                if match is None:
+                    break
+                tag = match.group(0)
+                name_match = TAG_NAME.match(tag)
+                name = name_match.group(1).lower() if name_match is not None else None
+                block = name is None or name in BLOCK_TAGS
+
+                if self.pending_space and not (block or self.after_block):
+                    out.append(" ")
+                self.pending_space = False
+                self.after_block = block
+                out.append(tag)
+                if name in RAW_TAGS and not tag.startswith("</") and not tag.endswith("/>"):
+                    self.raw_close = re.compile(f"</{name}", re.IGNORECASE)
+                position = match.end()
+                continue
+
+            end = buffer.find("<", position)
+            if end == -1:
+                end = len(buffer)
+            collapsed = HTML_WHITESPACE.sub(" ", buffer[position:end])
+            position = end
+
+            if collapsed == " ":
+                self.pending_space = True
+                continue
+            if collapsed.startswith(" "):
+                self.pending_space = True
+                collapsed = collapsed[1:]
+            if self.pending_space and not self.after_block:
+                out.append(" ")
+            self.pending_space = collapsed.endswith(" ")
+            self.after_block = False
+            out.append(collapsed[:-1] if self.pending_space else collapsed)
+
+        self.buffer = buffer[position:]
+        _ = self.stream.write("".join(out))
+
+
+def minify_html(html: str) -> str:
+    stream = io.StringIO()
+    writer = MinifyingWriter(stream)
+    _ = writer.write(html)
+    writer.close()
+    return stream.getvalue()
+
+
+def minify_css(css: str) -> str:
+    out: list[str] = []
+    pending_space = False
+
+    for match in CSS_TOKEN.finditer(css):
+        string, comment, space, token = match.groups()
+        if comment is not None or space is not None:
+            pending_space = True
+            continue
+
+        piece = string if string is not None else token
+        if pending_space and out and out[-1][-1] not in CSS_NO_SPACE_AFTER and piece[0] not in CSS_NO_SPACE_BEFORE:
+            out.append(" ")
+        pending_space = False
+        if piece == "}" and out and out[-1] == ";":
+            _ = out.pop()
+        out.append(piece)
+
+    return "".join(out)
+
+
+def minified_css_path(source_path: str, cache_dir: str = MINIFIED_CSS_DIR) -> str:
+    # Keyed by input hash, so each distinct stylesheet is minified once across builds and trees
+    cache_path = os.path.join(cache_dir, hash_file(source_path) + ".css")
+    if not os.path.exists(cache_path):
+        with open(source_path, "r") as f:
+            css = minify_css(f.read())
+        os.makedirs(cache_dir, exist_ok=True)
+        atomic_write(cache_path, css)
+    return cache_path
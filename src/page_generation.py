@@ -1,44 +1,250 @@
-from pathlib import Path
-from typing import final
-from blocktext import markdown_to_html_node
+from collections.abc import Iterable, Iterator
+from typing import TextIO
+from blocktext import markdown_to_html_nodes
+from htmlnode import HTMLNode, LeafNode, StreamingParentNode
+from template import Slot, Template, load_template
+from fragment_cache import open_fragment_cache
+from image_index import ImageIndex, read_image_urls
+from link_check import LinkRef
+from metadata import blank_front_matter, read_page_head
+from manifest import MANIFEST_PATH, BuildManifest, atomic_path, hash_file, remove_empty_dirs
+from site_index import SiteIndex
+from buildlog import flush_logging, logger
 import os
 
+INPUT_BUFFER_SIZE = 1 << 16
+OUTPUT_BUFFER_SIZE = 1 << 16
+
+
+class RenderOptions:
+    def __init__(self, fragment_cache_path: str | None = None, minify: bool = False, images: ImageIndex | None = None, pipeline: int = 0, check_links: bool = False) -> None:
+        # Opened lazily in whichever process renders the page
+        self.fragment_cache_path: str | None = fragment_cache_path
+        self.minify: bool = minify
+        self.images: ImageIndex | None = images
+        # I/O threads for the asyncio pipeline used by single-process builds, 0 to render page by page
+        self.pipeline: int = pipeline
+        # Record every link and image target while rendering, for check_links after the build
+        self.check_links: bool = check_links
+
+    def output_settings(self) -> dict[str, bool]:
+        # Image sizes are tracked per page in the manifest, so only switching sizing on or off is global
+        return {"minify": self.minify, "images": self.images is not None}
+
+
+def extract_title_from_lines(lines: Iterable[str]) -> str:
+    title = read_page_head(lines).title
+    if title is None:
+        raise Exception("No title found")
+    return title
+
 def extract_title(md: str) -> str:
-    for line in md.splitlines():
-        if line.startswith("# "):
-            return line[2:].strip()
-    raise Exception("No title found")
+    return extract_title_from_lines(md.splitlines())
+
+def write_content(stream: TextIO, template: Template, title: str, content_node: HTMLNode, minify: bool = False):
+    if minify:
+        from minify import MinifyingWriter
+
+        with MinifyingWriter(stream) as minified_stream:
+            template.write(minified_stream, {Slot.TITLE: title, Slot.CONTENT: content_node})
+    else:
+        template.write(stream, {Slot.TITLE: title, Slot.CONTENT: content_node})
+
+def write_page(dest_path: str, template: Template, title: str, content_node: HTMLNode, minify: bool = False):
+    # Stream into a sibling temp file so a failed render never leaves a half-written page behind
+    with atomic_path(dest_path) as tmp_path, open(tmp_path, "w", buffering=OUTPUT_BUFFER_SIZE) as dest_file:
+        write_content(dest_file, template, title, content_node, minify)
+
+def generate_page(from_path: str, template_path: str, dest_path: str, basepath: str = "/", options: RenderOptions | None = None) -> list[LinkRef]:
+    logger.info("Generating page from %s to %s using %s", from_path, dest_path, template_path)
+
+    refs: list[LinkRef] = []
+    with open(from_path, "r", buffering=INPUT_BUFFER_SIZE) as source:
+        template, title, content_node = render_source(source, template_path, basepath, options, refs)
+        write_page(dest_path, template, title, content_node, options is not None and options.minify)
 
-def generate_page(from_path: str, template_path: str, dest_path: str, basepath: str = "/"):
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+    flush_fragment_cache(options)
+    return refs
 
-    from_content: str
-    template_content: str
+def render_source(source: TextIO, template_path: str, basepath: str = "/", options: RenderOptions | None = None, refs: list[LinkRef] | None = None) -> tuple[Template, str, HTMLNode]:
+    template = load_template(template_path, basepath)
 
-    with open(from_path, "r") as f:
-        from_content = f.read()
-    with open(template_path, "r") as f:
-        template_content = f.read()
+    cache = None
+    if options is not None and options.fragment_cache_path is not None:
+        cache = open_fragment_cache(options.fragment_cache_path)
 
-    title = extract_title(from_content)
-    from_content_html = markdown_to_html_node(from_content).to_html()
+    # The source is read twice but never held whole: a title scan that stops at the first
+    # heading, then a block stream that is rendered as the page is written one block at a time
+    head = read_page_head(source)
+    if head.title is None:
+        raise Exception("No title found")
+    _ = source.seek(0)
+    lines = source if head.body_start == 0 else blank_front_matter(source, head.body_start)
+    images = options.images if options is not None else None
+    # Targets are appended as the blocks stream past, so refs is only complete once the page is written
+    if options is None or not options.check_links:
+        refs = None
+    return template, head.title, StreamingParentNode("div", nonempty_body(markdown_to_html_nodes(lines, basepath, cache, images, refs)))
 
-    final_html = template_content.replace("{{ Title }}", title)\
-        .replace("{{ Content }}", from_content_html)\
-        .replace("href=\"/", f"href=\"{basepath}")\
-        .replace("src=\"/", f"src=\"{basepath}")
+def nonempty_body(nodes: Iterable[HTMLNode]) -> Iterator[HTMLNode]:
+    # A page that is all front matter still renders, with an empty content div
+    empty = True
+    for node in nodes:
+        empty = False
+        yield node
+    if empty:
+        yield LeafNode(None, "")
 
-    with open(dest_path, "w") as dest_file:
-        _ = dest_file.write(final_html)
+def flush_fragment_cache(options: RenderOptions | None) -> None:
+    if options is not None and options.fragment_cache_path is not None:
+        open_fragment_cache(options.fragment_cache_path).flush()
 
 
 def generate_pages_recursive(dir_path_content: str, template_path: str, dest_dir_path: str, basepath: str = "/"):
-    for path in os.listdir(dir_path_content):
-        print(path)
-        if os.path.isdir(dir_path_content + "/" + path):
-            os.mkdir(dest_dir_path + "/" + path)
-            generate_pages_recursive(dir_path_content + "/" + path, template_path, dest_dir_path + "/" + path, basepath)
-        elif os.path.splitext(path)[1] == ".md":
-            generate_page(dir_path_content + "/" + path, template_path, dest_dir_path + "/" + os.path.splitext(path)[0] + ".html", basepath)
+    site = SiteIndex.build(dir_path_content, dest_dir_path)
+    for dest_dir in site.output_dirs():
+        os.makedirs(dest_dir, exist_ok=True)
+    for page in site.pages:
+        _ = generate_page(page.source_path, template_path, page.output_path, basepath)
+
+
+def collect_page_tasks(dir_path_content: str, dest_dir_path: str) -> list[tuple[str, str]]:
+    return SiteIndex.build(dir_path_content, dest_dir_path).tasks()
+
+
+class BuildResult:
+    def __init__(self) -> None:
+        self.rendered: list[str] = []
+        # (source path, error message) for every page that failed to render
+        self.errors: list[tuple[str, str]] = []
+        # source path -> link and image targets, for rendered pages when links are checked
+        self.refs: dict[str, list[LinkRef]] = {}
+
+    def report_errors(self) -> None:
+        for source_path, message in self.errors:
+            logger.error("Error generating %s: %s", source_path, message)
+
+
+def render_page_task(task: tuple[str, str, str, str, RenderOptions | None]) -> tuple[str | None, list[LinkRef]]:
+    source_path, template_path, dest_path, basepath, options = task
+    try:
+        refs = generate_page(source_path, template_path, dest_path, basepath, options)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", []
+    return None, refs
+
+
+def init_render_worker() -> None:
+    from multiprocessing.util import Finalize
+
+    # Pool workers skip atexit, so buffered log records are flushed by the worker's own finalizer
+    _ = Finalize(None, flush_logging, exitpriority=0)
+
+
+def render_pages(tasks: list[tuple[str, str]], template_path: str, basepath: str = "/", jobs: int = 1, options: RenderOptions | None = None) -> BuildResult:
+    result = BuildResult()
+
+    for dest_dir in sorted({os.path.dirname(dest_path) for _, dest_path in tasks}):
+        os.makedirs(dest_dir, exist_ok=True)
+
+    page_tasks = [(source_path, template_path, dest_path, basepath, options) for source_path, dest_path in tasks]
+
+    if jobs <= 1 and options is not None and options.pipeline > 0 and len(page_tasks) > 1:
+        from pipeline import render_pipeline
+
+        outcomes = render_pipeline(page_tasks, options.pipeline)
+    elif jobs <= 1 or len(page_tasks) <= 1:
+        outcomes = list(map(render_page_task, page_tasks))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunksize = max(1, len(page_tasks) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_render_worker) as executor:
+            outcomes = list(executor.map(render_page_task, page_tasks, chunksize=chunksize))
+
+    # Results come back in task order, so reporting is deterministic whatever the worker scheduling
+    for (source_path, _), (error, refs) in zip(tasks, outcomes):
+        if error is None:
+            result.rendered.append(source_path)
+            if options is not None and options.check_links:
+                result.refs[source_path] = refs
+        else:
+            result.errors.append((source_path, error))
+
+    return result
+
+
+def generate_pages_parallel(dir_path_content: str, template_path: str, dest_dir_path: str, basepath: str = "/", jobs: int = 1, options: RenderOptions | None = None, site: SiteIndex | None = None) -> BuildResult:
+    if site is None:
+        site = SiteIndex.build(dir_path_content, dest_dir_path)
+    return render_pages(site.tasks(), template_path, basepath, jobs, options)
+
+
+def generate_pages_incremental(dir_path_content: str, template_path: str, dest_dir_path: str, basepath: str = "/", manifest_path: str = MANIFEST_PATH, jobs: int = 1, options: RenderOptions | None = None, site: SiteIndex | None = None) -> BuildResult:
+    old_manifest = BuildManifest.load(manifest_path)
+    template_hash = hash_file(template_path)
+    # A new template, basepath or output setting changes every page, so nothing from the old manifest can be trusted
+    settings = options.output_settings() if options is not None else RenderOptions().output_settings()
+    rebuild_all = not old_manifest.matches_build(template_hash, basepath, dest_dir_path, settings)
+
+    new_manifest = BuildManifest(template_hash, basepath, dest_dir_path, settings=settings)
+    stale_tasks: list[tuple[str, str]] = []
+    check_links = options is not None and options.check_links
+    images = options.images if options is not None else None
+    kept_refs: dict[str, list[LinkRef]] = {}
+
+    if site is None:
+        site = SiteIndex.build(dir_path_content, dest_dir_path)
+
+    for page in site.pages:
+        source_path, dest_path = page.source_path, page.output_path
+        old_record = old_manifest.pages.get(source_path)
+
+        # The walk already stat'ed every source, so only files whose stat changed are read and hashed
+        stat_unchanged = old_record is not None and old_record.get("mtime_ns") == page.mtime_ns and old_record.get("size") == page.size
+        source_hash = old_record["hash"] if stat_unchanged else hash_file(source_path)
+        record = {"hash": source_hash, "output": dest_path, "mtime_ns": page.mtime_ns, "size": page.size}
+        new_manifest.pages[source_path] = record
+
+        # Each page depends on the sizes of the images it shows, not on the whole image index
+        if images is not None:
+            record["image_urls"] = old_record["image_urls"] if stat_unchanged and "image_urls" in old_record else read_image_urls(source_path)
+            record["images"] = images.signature(record["image_urls"], basepath)
+        images_unchanged = old_record is not None and old_record.get("images") == record.get("images")
+
+        if not rebuild_all and images_unchanged and old_record.get("hash") == source_hash and old_record.get("output") == dest_path and os.path.exists(dest_path):
+            # Skipped pages are checked against the targets recorded when they were last rendered
+            if "links" in old_record:
+                new_manifest.pages[source_path]["links"] = old_record["links"]
+                kept_refs[source_path] = [(line, kind, target) for line, kind, target in old_record["links"]]
+                continue
+            if not check_links:
+                continue
+
+        stale_tasks.append((source_path, dest_path))
+
+    result = render_pages(stale_tasks, template_path, basepath, jobs, options)
+    for source_path, refs in result.refs.items():
+        new_manifest.pages[source_path]["links"] = refs
+    if check_links:
+        result.refs.update(kept_refs)
+
+    # Leave failed pages out of the manifest so the next build retries them
+    failed_sources = {source_path for source_path, _ in result.errors}
+    for source_path in failed_sources:
+        del new_manifest.pages[source_path]
 
+    # Outputs are only ours to delete if the previous build wrote into the same tree
+    stale_records = old_manifest.pages.items() if old_manifest.dest_dir == dest_dir_path else []
+    for source_path, old_record in stale_records:
+        if source_path in failed_sources:
+            continue
+        if source_path in new_manifest.pages and new_manifest.pages[source_path]["output"] == old_record["output"]:
+            continue
+        if os.path.exists(old_record["output"]):
+            logger.info("Removing stale page %s", old_record["output"])
+            os.remove(old_record["output"])
+            remove_empty_dirs(os.path.dirname(old_record["output"]), dest_dir_path)
 
+    new_manifest.save(manifest_path)
+    return result
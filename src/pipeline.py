@@ -0,0 +1,77 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from buildlog import logger
+from htmlnode import LeafNode
+from link_check import LinkRef
+from page_generation import INPUT_BUFFER_SIZE, RenderOptions, flush_fragment_cache, render_source, write_page
+from template import Template
+
+PageTask = tuple[str, str, str, str, RenderOptions | None]
+
+
+def read_source(source_path: str) -> str:
+    with open(source_path, "r", buffering=INPUT_BUFFER_SIZE) as f:
+        return f.read()
+
+
+def render_text(source_text: str, template_path: str, basepath: str, options: RenderOptions | None, refs: list[LinkRef] | None = None) -> tuple[Template, str, LeafNode]:
+    # Unlike generate_page this holds the whole source and the whole rendered body, which is
+    # what lets them be read ahead and written behind; the template is applied by write_page
+    template, title, content_node = render_source(io.StringIO(source_text), template_path, basepath, options, refs)
+    content = LeafNode(None, content_node.to_html())
+    flush_fragment_cache(options)
+    return template, title, content
+
+
+def describe(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+async def run_pipeline(tasks: list[PageTask], executor: ThreadPoolExecutor, concurrency: int) -> list[tuple[str | None, list[LinkRef]]]:
+    loop = asyncio.get_running_loop()
+    # Bounds how many sources are read ahead of the renderer, and so how many are held in memory
+    reads: asyncio.Queue[tuple[int, asyncio.Future[str]] | None] = asyncio.Queue(maxsize=concurrency)
+    write_slots = asyncio.Semaphore(concurrency)
+    outcomes: list[tuple[str | None, list[LinkRef]]] = [(None, []) for _ in tasks]
+    writes: list[asyncio.Future[None]] = []
+
+    async def reader() -> None:
+        for position, (source_path, _, _, _, _) in enumerate(tasks):
+            await reads.put((position, loop.run_in_executor(executor, read_source, source_path)))
+        await reads.put(None)
+
+    def finish_write(position: int, write: asyncio.Future[None]) -> None:
+        write_slots.release()
+        if not write.cancelled() and write.exception() is not None:
+            outcomes[position] = (describe(write.exception()), [])
+
+    reading = asyncio.create_task(reader())
+    while (item := await reads.get()) is not None:
+        position, read = item
+        source_path, template_path, dest_path, basepath, options = tasks[position]
+        logger.info("Generating page from %s to %s using %s", source_path, dest_path, template_path)
+        try:
+            # Rendering stays on the loop thread; the next reads and the last writes run meanwhile
+            refs: list[LinkRef] = []
+            template, title, content = render_text(await read, template_path, basepath, options, refs)
+        except Exception as e:
+            outcomes[position] = (describe(e), [])
+            continue
+        outcomes[position] = (None, refs)
+
+        await write_slots.acquire()
+        write = loop.run_in_executor(executor, write_page, dest_path, template, title, content, options is not None and options.minify)
+        write.add_done_callback(lambda write, position=position: finish_write(position, write))
+        writes.append(write)
+
+    await reading
+    _ = await asyncio.gather(*writes, return_exceptions=True)
+    return outcomes
+
+
+def render_pipeline(tasks: list[PageTask], concurrency: int = 4) -> list[tuple[str | None, list[LinkRef]]]:
+    concurrency = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ssg-io") as executor:
+        return asyncio.run(run_pipeline(tasks, executor, concurrency))
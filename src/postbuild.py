@@ -0,0 +1,196 @@
+import json
+import os
+import re
+import shutil
+
+from manifest import CACHE_DIR, atomic_path, atomic_write, hash_file, remove_empty_dirs
+
+POSTBUILD_MANIFEST_PATH = os.path.join(CACHE_DIR, "postbuild_manifest.json")
+FINGERPRINT_EXTENSIONS = (".css", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".svg", ".ico")
+COMPRESS_EXTENSIONS = (".html", ".css", ".js", ".svg", ".json", ".xml", ".txt")
+FINGERPRINT_LENGTH = 10
+URL_ATTRIBUTE = re.compile(r'\b(href|src)="([^"]*)"')
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]*)\1\s*\)""")
+
+
+class PostBuildResult:
+    def __init__(self) -> None:
+        self.fingerprinted: dict[str, str] = {}
+        self.rewritten: list[str] = []
+        self.compressed: list[str] = []
+        self.removed: list[str] = []
+
+
+def load_postbuild_manifest(path: str, dest_dir: str) -> dict[str, dict[str, str]]:
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("dest_dir") != dest_dir:
+        return {}
+    return data
+
+
+def save_postbuild_manifest(path: str, data: dict[str, str | dict[str, str]]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    atomic_write(path, json.dumps(data, indent=1, sort_keys=True))
+
+
+def fingerprinted_name(rel_path: str, digest: str) -> str:
+    stem, extension = os.path.splitext(rel_path)
+    return f"{stem}.{digest[:FINGERPRINT_LENGTH]}{extension}"
+
+
+def rewrite_urls(text: str, pattern: re.Pattern[str], group: int, urls: dict[str, str]) -> str:
+    def replace(match: re.Match[str]) -> str:
+        new_url = urls.get(match.group(group))
+        if new_url is None:
+            return match.group(0)
+        start, end = match.span(group)
+        return match.group(0)[:start - match.start()] + new_url + match.group(0)[end - match.start():]
+    return pattern.sub(replace, text)
+
+
+def write_if_changed(path: str, text: str) -> bool:
+    with open(path, "r") as f:
+        if f.read() == text:
+            return False
+    atomic_write(path, text)
+    return True
+
+
+def link_or_copy(source_path: str, target_path: str) -> None:
+    with atomic_path(target_path) as tmp_path:
+        try:
+            os.link(source_path, tmp_path)
+        except OSError:
+            _ = shutil.copy2(source_path, tmp_path)
+
+
+def fingerprint_assets(dest_dir: str, static_dir: str, basepath: str, old_assets: dict[str, str], result: PostBuildResult) -> dict[str, str]:
+    from statics import list_files
+
+    assets = [rel_path for rel_path in list_files(static_dir) if os.path.splitext(rel_path)[1].lower() in FINGERPRINT_EXTENSIONS]
+    # Images are named first so stylesheets can point at their hashed names before being hashed themselves
+    assets.sort(key=lambda rel_path: (rel_path.endswith(".css"), rel_path))
+
+    urls: dict[str, str] = {}
+    new_assets: dict[str, str] = {}
+    for rel_path in assets:
+        path = os.path.join(dest_dir, rel_path)
+        if not os.path.isfile(path):
+            continue
+        if rel_path.endswith(".css"):
+            with open(path, "r") as f:
+                css = f.read()
+            _ = write_if_changed(path, rewrite_urls(css, CSS_URL, 2, urls))
+
+        # The original stays in place for anything outside the build that links to it
+        hashed_name = fingerprinted_name(rel_path, hash_file(path))
+        hashed_path = os.path.join(dest_dir, hashed_name)
+        if not os.path.exists(hashed_path):
+            link_or_copy(path, hashed_path)
+        new_assets[rel_path] = hashed_name
+        result.fingerprinted[rel_path] = hashed_name
+        urls[basepath + rel_path] = basepath + hashed_name
+        # Pages left alone by an incremental build still point at last build's hashed name
+        if rel_path in old_assets:
+            urls[basepath + old_assets[rel_path]] = basepath + hashed_name
+
+    for root, _, file_names in os.walk(dest_dir):
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".html"):
+                continue
+            path = os.path.join(root, file_name)
+            with open(path, "r") as f:
+                html = f.read()
+            if write_if_changed(path, rewrite_urls(html, URL_ATTRIBUTE, 2, urls)):
+                result.rewritten.append(os.path.relpath(path, dest_dir))
+
+    for rel_path, old_name in old_assets.items():
+        if new_assets.get(rel_path) != old_name and os.path.exists(os.path.join(dest_dir, old_name)):
+            os.remove(os.path.join(dest_dir, old_name))
+            result.removed.append(old_name)
+            remove_empty_dirs(os.path.dirname(os.path.join(dest_dir, old_name)), dest_dir)
+
+    return new_assets
+
+
+def compress_file(path: str) -> None:
+    import gzip
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    # mtime=0 keeps the .gz byte-identical across builds of the same input
+    atomic_write(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+
+    try:
+        import brotli
+    except ImportError:
+        return
+    atomic_write(path + ".br", brotli.compress(data, mode=brotli.MODE_TEXT))
+
+
+def has_brotli() -> bool:
+    try:
+        import brotli
+    except ImportError:
+        return False
+    return True
+
+
+def precompress(dest_dir: str, old_hashes: dict[str, str], jobs: int, result: PostBuildResult) -> dict[str, str]:
+    suffixes = (".gz", ".br") if has_brotli() else (".gz",)
+
+    new_hashes: dict[str, str] = {}
+    stale: list[str] = []
+    for root, _, file_names in os.walk(dest_dir):
+        for file_name in sorted(file_names):
+            if os.path.splitext(file_name)[1].lower() not in COMPRESS_EXTENSIONS:
+                continue
+            path = os.path.join(root, file_name)
+            rel_path = os.path.relpath(path, dest_dir)
+            new_hashes[rel_path] = hash_file(path)
+            if old_hashes.get(rel_path) != new_hashes[rel_path] or not all(os.path.exists(path + suffix) for suffix in suffixes):
+                stale.append(path)
+
+    if jobs <= 1 or len(stale) <= 1:
+        for path in stale:
+            compress_file(path)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            _ = list(executor.map(compress_file, stale, chunksize=max(1, len(stale) // (jobs * 4))))
+    result.compressed.extend(os.path.relpath(path, dest_dir) for path in stale)
+
+    # Siblings are only removed for files this stage compressed before
+    for rel_path in old_hashes:
+        if rel_path in new_hashes:
+            continue
+        for suffix in (".gz", ".br"):
+            path = os.path.join(dest_dir, rel_path + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+                result.removed.append(rel_path + suffix)
+                remove_empty_dirs(os.path.dirname(path), dest_dir)
+
+    return new_hashes
+
+
+def post_build(dest_dir: str, static_dir: str = "static", basepath: str = "/", fingerprint: bool = False, compress: bool = False, jobs: int = 1, manifest_path: str = POSTBUILD_MANIFEST_PATH) -> PostBuildResult:
+    old_manifest = load_postbuild_manifest(manifest_path, dest_dir)
+    result = PostBuildResult()
+
+    assets: dict[str, str] = {}
+    if fingerprint:
+        assets = fingerprint_assets(dest_dir, static_dir, basepath, old_manifest.get("assets", {}), result)
+
+    hashes: dict[str, str] = {}
+    if compress:
+        hashes = precompress(dest_dir, old_manifest.get("compressed", {}), jobs, result)
+
+    save_postbuild_manifest(manifest_path, {"dest_dir": dest_dir, "assets": assets, "compressed": hashes})
+    return result
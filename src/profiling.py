@@ -0,0 +1,123 @@
+import functools
+import json
+import os
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+import blocktext
+import page_generation
+from textnode import TextNode
+
+PROFILE_FORMATS = ("json", "chrome")
+
+
+class Span:
+    def __init__(self, name: str, page: str | None, start: float, depth: int) -> None:
+        self.name: str = name
+        self.page: str | None = page
+        self.start: float = start
+        self.depth: int = depth
+        self.duration: float = 0.0
+        self.child_time: float = 0.0
+        self.allocated_blocks: int = 0
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+        self.stack: list[Span] = []
+        self.page: str | None = None
+        self.origin: float = time.perf_counter()
+        self.patches: list[tuple[Any, str, Any]] = []
+
+    def wrap(self, name: str, fn: Callable[..., Any], page_arg: bool = False) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if page_arg:
+                self.page = args[0]
+            span = Span(name, self.page, time.perf_counter(), len(self.stack))
+            blocks_before = sys.getallocatedblocks()
+            self.stack.append(span)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _ = self.stack.pop()
+                span.duration = time.perf_counter() - span.start
+                span.allocated_blocks = sys.getallocatedblocks() - blocks_before
+                if self.stack:
+                    self.stack[-1].child_time += span.duration
+                self.spans.append(span)
+                if page_arg:
+                    self.page = None
+        return wrapper
+
+    def patch(self, owner: Any, attribute: str, replacement: Any) -> None:
+        self.patches.append((owner, attribute, owner.__dict__[attribute] if isinstance(owner, type) else getattr(owner, attribute)))
+        setattr(owner, attribute, replacement)
+
+    def install(self) -> None:
+        # Hooks only exist while a profile is being taken, so unprofiled builds run untouched code
+        self.patch(page_generation, "generate_page", self.wrap("page", page_generation.generate_page, page_arg=True))
+        self.patch(page_generation, "read_page_head", self.wrap("title_scan", page_generation.read_page_head))
+        self.patch(blocktext, "block_to_html_node", self.wrap("blocks", blocktext.block_to_html_node))
+        self.patch(TextNode, "nodes_from_text", staticmethod(self.wrap("inline", TextNode.nodes_from_text)))
+        # Pages stream block by block, so this stage's self time is source reads, serialization and writes
+        self.patch(page_generation, "write_page", self.wrap("stream", page_generation.write_page))
+
+    def uninstall(self) -> None:
+        while self.patches:
+            owner, attribute, original = self.patches.pop()
+            setattr(owner, attribute, original)
+
+    def stage_totals(self) -> dict[str, dict[str, float | int]]:
+        totals: dict[str, dict[str, float | int]] = {}
+        for span in self.spans:
+            total = totals.setdefault(span.name, {"calls": 0, "wall_seconds": 0.0, "self_seconds": 0.0, "allocated_blocks": 0})
+            total["calls"] += 1
+            total["wall_seconds"] += span.duration
+            total["self_seconds"] += span.duration - span.child_time
+            total["allocated_blocks"] += span.allocated_blocks
+        return totals
+
+    def page_reports(self) -> list[dict[str, Any]]:
+        pages: dict[str, dict[str, Any]] = {}
+        for span in self.spans:
+            if span.page is None:
+                continue
+            page = pages.setdefault(span.page, {"page": span.page, "wall_seconds": 0.0, "stages": {}})
+            if span.name == "page":
+                page["wall_seconds"] = span.duration
+                page["allocated_blocks"] = span.allocated_blocks
+            else:
+                page["stages"][span.name] = page["stages"].get(span.name, 0.0) + span.duration - span.child_time
+        return sorted(pages.values(), key=lambda page: page["wall_seconds"], reverse=True)
+
+    def report(self, slowest: int = 10) -> dict[str, Any]:
+        pages = self.page_reports()
+        return {"stages": self.stage_totals(), "slowest_pages": pages[:slowest], "pages": pages}
+
+    def chrome_trace(self) -> dict[str, Any]:
+        pid = os.getpid()
+        events = [{
+            "name": span.name,
+            "ph": "X",
+            "ts": (span.start - self.origin) * 1e6,
+            "dur": span.duration * 1e6,
+            "pid": pid,
+            "tid": 0,
+            "args": {"page": span.page, "allocated_blocks": span.allocated_blocks},
+        } for span in sorted(self.spans, key=lambda span: span.start)]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path: str, profile_format: str = "json") -> None:
+        data = self.chrome_trace() if profile_format == "chrome" else self.report()
+        with open(path, "w") as f:
+            json.dump(data, f, indent=None if profile_format == "chrome" else 1)
+
+    def print_summary(self, slowest: int = 10) -> None:
+        for name, total in sorted(self.stage_totals().items(), key=lambda item: item[1]["self_seconds"], reverse=True):
+            print(f"{name:>16}: {total['self_seconds'] * 1000:9.1f} ms self, {total['calls']} calls")
+        for page in self.page_reports()[:slowest]:
+            print(f"{page['wall_seconds'] * 1000:9.1f} ms  {page['page']}")
@@ -1,7 +1,41 @@
-import re
+from collections.abc import Iterator
+
+def scan_markdown_targets(text: str, image: bool) -> Iterator[tuple[int, int, str, str]]:
+    # Yields (start, end, text, url) for exactly the matches of the lazy patterns
+    # !\[(.*?)\]\((.*?)\) and (?<!!)\[(.*?)\]\((.*?)\), in one forward pass. Each find result is
+    # cached until the scan passes it, so unclosed brackets never rescan the rest of the text.
+    opener = "![" if image else "["
+    text_len = len(text)
+    close_at = newline_at = paren_at = -1
+    i = text.find(opener)
+
+    while i != -1:
+        text_start = i + len(opener)
+        if not image and i > 0 and text[i - 1] == "!":
+            i = text.find(opener, i + 1)
+            continue
+
+        if close_at < text_start:
+            close_at = text.find("](", text_start)
+            if close_at == -1:
+                return
+        if newline_at < text_start:
+            newline_at = text.find("\n", text_start)
+            newline_at = text_len if newline_at == -1 else newline_at
+        if paren_at < close_at + 2:
+            paren_at = text.find(")", close_at + 2)
+            paren_at = text_len if paren_at == -1 else paren_at
+
+        # "." stops at newlines, and a later "](" can never reach a ")" the first one could not
+        if paren_at == text_len or newline_at < paren_at:
+            i = text.find(opener, i + 1)
+            continue
+
+        yield i, paren_at + 1, text[text_start:close_at], text[close_at + 2:paren_at]
+        i = text.find(opener, paren_at + 1)
 
 def extract_markdown_images(text: str) -> list[tuple[str, str]]:
-    return re.findall(r"!\[(.*?)\]\((.*?)\)", text)
+    return [(alt, url) for _, _, alt, url in scan_markdown_targets(text, True)]
 
 def extract_markdown_links(text: str) -> list[tuple[str, str]]:
-    return re.findall(r"(?<!!)\[(.*?)\]\((.*?)\)", text)
+    return [(anchor, url) for _, _, anchor, url in scan_markdown_targets(text, False)]
@@ -0,0 +1,155 @@
+import json
+import os
+import re
+from typing import Any
+
+from blocktext import markdown_to_html_nodes
+from htmlnode import HTMLNode
+from manifest import CACHE_DIR, atomic_write, hash_bytes
+from metadata import blank_front_matter, read_page_head
+from page_generation import extract_title
+from site_index import SiteIndex
+
+SEARCH_CACHE_PATH = os.path.join(CACHE_DIR, "search.json")
+SEARCH_DIR_NAME = "search"
+SEARCH_INDEX_VERSION = 1
+PREFIX_LENGTH = 2
+TERM = re.compile(r"\w+")
+
+
+class SearchResult:
+    def __init__(self) -> None:
+        self.indexed: list[str] = []
+        self.written: list[str] = []
+        self.removed: list[str] = []
+
+
+def node_text(node: HTMLNode) -> list[str]:
+    texts: list[str] = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.value:
+            texts.append(current.value)
+        if "alt" in current.props:
+            texts.append(current.props["alt"])
+        if current.children:
+            stack.extend(reversed(current.children))
+    return texts
+
+
+def page_terms(md: str, basepath: str = "/") -> dict[str, list[int]]:
+    # Walks the same nodes the page is rendered from, so search sees exactly the rendered text
+    terms: dict[str, list[int]] = {}
+    position = 0
+    lines = md.split("\n")
+    for node in markdown_to_html_nodes(blank_front_matter(lines, read_page_head(lines).body_start), basepath):
+        for text in node_text(node):
+            for match in TERM.finditer(text.lower()):
+                terms.setdefault(match.group(0), []).append(position)
+                position += 1
+    return terms
+
+
+def page_url(rel_output: str, basepath: str) -> str:
+    url = basepath + rel_output.replace(os.sep, "/")
+    return url.removesuffix("index.html")
+
+
+def shard_key(term: str) -> str:
+    return term[:PREFIX_LENGTH]
+
+
+def load_search_cache(path: str, dest_dir: str, basepath: str) -> dict[str, Any]:
+    empty = {"pages": {}, "shards": {}, "meta": None}
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return empty
+    if data.get("version") != SEARCH_INDEX_VERSION or data.get("dest_dir") != dest_dir or data.get("basepath") != basepath:
+        return empty
+    return data
+
+
+def write_json_if_changed(path: str, data: object, old_digest: str | None) -> tuple[str, bool]:
+    text = json.dumps(data, separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+    digest = hash_bytes(text.encode())
+    if digest == old_digest and os.path.exists(path):
+        return digest, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write(path, text)
+    return digest, True
+
+
+def build_search_index(content_dir: str, dest_dir: str, basepath: str = "/", cache_path: str = SEARCH_CACHE_PATH, site: SiteIndex | None = None) -> SearchResult:
+    if site is None:
+        site = SiteIndex.build(content_dir, dest_dir)
+    cache = load_search_cache(cache_path, dest_dir, basepath)
+    old_pages: dict[str, dict[str, Any]] = cache["pages"]
+    old_shards: dict[str, str] = cache["shards"]
+    result = SearchResult()
+
+    # Page ids stay put across builds, so a changed page only rewrites the shards its terms land in
+    live_pages = {page.rel_path for page in site.pages}
+    used_ids = {record["id"] for rel_path, record in old_pages.items() if rel_path in live_pages}
+    free_ids = (page_id for page_id in range(len(site.pages) + len(old_pages) + 1) if page_id not in used_ids)
+
+    pages: dict[str, dict[str, Any]] = {}
+    for page in site.pages:
+        record = old_pages.get(page.rel_path)
+        if record is not None and record["mtime_ns"] == page.mtime_ns and record["size"] == page.size:
+            pages[page.rel_path] = record
+            continue
+
+        with open(page.source_path, "r") as f:
+            md = f.read()
+        source_hash = hash_bytes(md.encode())
+        if record is not None and record["hash"] == source_hash:
+            pages[page.rel_path] = dict(record, mtime_ns=page.mtime_ns, size=page.size)
+            continue
+
+        try:
+            title = extract_title(md)
+        except Exception:
+            title = page.rel_path
+        pages[page.rel_path] = {
+            "id": record["id"] if record is not None else next(free_ids),
+            "hash": source_hash,
+            "mtime_ns": page.mtime_ns,
+            "size": page.size,
+            "url": page_url(os.path.relpath(page.output_path, dest_dir), basepath),
+            "title": title,
+            "terms": page_terms(md, basepath),
+        }
+        result.indexed.append(page.rel_path)
+
+    # term -> [[page id, position, ...], ...], grouped into one file per term prefix
+    shards: dict[str, dict[str, list[list[int]]]] = {}
+    for record in sorted(pages.values(), key=lambda record: record["id"]):
+        for term, positions in record["terms"].items():
+            shards.setdefault(shard_key(term), {}).setdefault(term, []).append([record["id"], *positions])
+
+    search_dir = os.path.join(dest_dir, SEARCH_DIR_NAME)
+    new_shards: dict[str, str] = {}
+    for key, postings in sorted(shards.items()):
+        new_shards[key], written = write_json_if_changed(os.path.join(search_dir, key + ".json"), postings, old_shards.get(key))
+        if written:
+            result.written.append(key)
+    for key in old_shards:
+        path = os.path.join(search_dir, key + ".json")
+        if key not in new_shards and os.path.exists(path):
+            os.remove(path)
+            result.removed.append(key)
+
+    page_table: list[list[str] | None] = [None] * (max((record["id"] for record in pages.values()), default=-1) + 1)
+    for record in pages.values():
+        page_table[record["id"]] = [record["url"], record["title"]]
+    meta = {"version": SEARCH_INDEX_VERSION, "prefix_length": PREFIX_LENGTH, "pages": page_table, "shards": sorted(new_shards)}
+    meta_digest, written = write_json_if_changed(os.path.join(search_dir, "index.json"), meta, cache["meta"])
+    if written:
+        result.written.append("index")
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    atomic_write(cache_path, json.dumps({"version": SEARCH_INDEX_VERSION, "dest_dir": dest_dir, "basepath": basepath, "pages": pages, "shards": new_shards, "meta": meta_digest}))
+    return result
@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import override
+
+from page_generation import RenderOptions, generate_page
+from manifest import remove_empty_dirs
+from statics import place_file, static_source
+from site_index import scan_files
+from buildlog import flush_logging, logger
+
+LIVE_RELOAD_PATH = "/__livereload"
+LIVE_RELOAD_SCRIPT = f'<script>new EventSource("{LIVE_RELOAD_PATH}").onmessage = () => location.reload();</script>'
+
+
+def snapshot_tree(root: str) -> dict[str, tuple[int, int]]:
+    return {entry.path: (entry.mtime_ns, entry.size) for entry in scan_files(root)}
+
+
+def diff_snapshots(old: dict[str, tuple[int, int]], new: dict[str, tuple[int, int]]) -> tuple[list[str], list[str]]:
+    changed = sorted(path for path, stat in new.items() if old.get(path) != stat)
+    removed = sorted(path for path in old if path not in new)
+    return changed, removed
+
+
+class LiveReload:
+    def __init__(self) -> None:
+        self.version: int = 0
+        self.condition: threading.Condition = threading.Condition()
+
+    def notify(self) -> None:
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, version: int, timeout: float) -> int:
+        with self.condition:
+            _ = self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class SiteWatcher:
+    def __init__(self, content_dir: str, static_dir: str, template_path: str, dest_dir: str, basepath: str = "/", options: RenderOptions | None = None) -> None:
+        self.content_dir: str = content_dir
+        self.static_dir: str = static_dir
+        self.template_path: str = template_path
+        self.dest_dir: str = dest_dir
+        self.basepath: str = basepath
+        self.options: RenderOptions | None = options
+        self.content: dict[str, tuple[int, int]] = snapshot_tree(content_dir)
+        self.static: dict[str, tuple[int, int]] = snapshot_tree(static_dir)
+        self.template: tuple[int, int] | None = self.template_stat()
+
+    def template_stat(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.template_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def page_output(self, source_path: str) -> str:
+        rel_path = os.path.relpath(source_path, self.content_dir)
+        return os.path.join(self.dest_dir, os.path.splitext(rel_path)[0] + ".html")
+
+    def render(self, source_path: str) -> None:
+        dest_path = self.page_output(source_path)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        try:
+            _ = generate_page(source_path, self.template_path, dest_path, self.basepath, self.options)
+        except Exception as e:
+            logger.error("Error generating %s: %s: %s", source_path, type(e).__name__, e)
+
+    def refresh_images(self) -> list[str]:
+        if self.options is None or self.options.images is None:
+            return []
+
+        from image_index import ImageIndex, read_image_urls
+        from template import prefix_url
+
+        images = ImageIndex.build(self.static_dir, self.basepath, self.options.images.index_path)
+        changed_srcs = images.changed_srcs(self.options.images)
+        self.options.images = images
+        if not changed_srcs:
+            return []
+        # Only the pages showing a resized image need it written into their img tags
+        return [source_path for source_path in self.content if source_path.endswith(".md")
+                and any(prefix_url(url, self.basepath) in changed_srcs for url in read_image_urls(source_path))]
+
+    def poll(self) -> bool:
+        content = snapshot_tree(self.content_dir)
+        static = snapshot_tree(self.static_dir)
+        template = self.template_stat()
+
+        changed_pages, removed_pages = diff_snapshots(self.content, content)
+        changed_assets, removed_assets = diff_snapshots(self.static, static)
+        template_changed = template != self.template
+
+        self.content, self.static, self.template = content, static, template
+
+        # A template edit touches every page; otherwise only edited sources and pages showing a resized image are rendered
+        if template_changed:
+            changed_pages = sorted(content)
+        elif changed_assets or removed_assets:
+            changed_pages = sorted(set(changed_pages) | set(self.refresh_images()))
+
+        for source_path in changed_pages:
+            if source_path.endswith(".md"):
+                self.render(source_path)
+        for source_path in removed_pages:
+            dest_path = self.page_output(source_path)
+            if source_path.endswith(".md") and os.path.exists(dest_path):
+                os.remove(dest_path)
+                remove_empty_dirs(os.path.dirname(dest_path), self.dest_dir)
+
+        for source_path in changed_assets:
+            minify = self.options is not None and self.options.minify
+            _ = place_file(static_source(source_path, minify), os.path.join(self.dest_dir, os.path.relpath(source_path, self.static_dir)))
+        for source_path in removed_assets:
+            dest_path = os.path.join(self.dest_dir, os.path.relpath(source_path, self.static_dir))
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+                remove_empty_dirs(os.path.dirname(dest_path), self.dest_dir)
+
+        return template_changed or bool(changed_pages or removed_pages or changed_assets or removed_assets)
+
+
+def make_handler(directory: str, live_reload: LiveReload) -> type[SimpleHTTPRequestHandler]:
+    class LiveReloadHandler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, directory=directory, **kwargs)
+
+        @override
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+        @override
+        def do_GET(self) -> None:
+            if self.path == LIVE_RELOAD_PATH:
+                self.stream_reloads()
+                return
+
+            path = self.translate_path(self.path)
+            if os.path.isdir(path):
+                path = os.path.join(path, "index.html")
+            if not path.endswith(".html") or not os.path.isfile(path):
+                super().do_GET()
+                return
+
+            with open(path, "rb") as f:
+                body = f.read()
+            body = body.replace(b"</body>", LIVE_RELOAD_SCRIPT.encode() + b"</body>", 1)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            _ = self.wfile.write(body)
+
+        def stream_reloads(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+
+            version = live_reload.version
+            try:
+                while True:
+                    new_version = live_reload.wait(version, 15)
+                    # Comment lines keep idle connections alive and surface closed sockets
+                    _ = self.wfile.write(b"data: reload\n\n" if new_version != version else b": ping\n\n")
+                    self.wfile.flush()
+                    version = new_version
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return LiveReloadHandler
+
+
+def serve(watcher: SiteWatcher, port: int = 8888, interval: float = 0.05) -> None:
+    live_reload = LiveReload()
+    server = ThreadingHTTPServer(("", port), make_handler(watcher.dest_dir, live_reload))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving {watcher.dest_dir} on http://localhost:{port}/ and watching for changes")
+
+    try:
+        while True:
+            time.sleep(interval)
+            start = time.perf_counter()
+            rebuilt = watcher.poll()
+            flush_logging()
+            if rebuilt:
+                print(f"Rebuilt in {(time.perf_counter() - start) * 1000:.1f} ms")
+                live_reload.notify()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
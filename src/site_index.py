@@ -0,0 +1,92 @@
+import hashlib
+import os
+import zlib
+
+
+class SiteEntry:
+    __slots__ = ("path", "rel_path", "mtime_ns", "size")
+
+    def __init__(self, path: str, rel_path: str, mtime_ns: int, size: int) -> None:
+        self.path: str = path
+        self.rel_path: str = rel_path
+        self.mtime_ns: int = mtime_ns
+        self.size: int = size
+
+
+class SitePage:
+    __slots__ = ("source_path", "output_path", "rel_path", "mtime_ns", "size")
+
+    def __init__(self, source_path: str, output_path: str, rel_path: str, mtime_ns: int, size: int) -> None:
+        self.source_path: str = source_path
+        self.output_path: str = output_path
+        self.rel_path: str = rel_path
+        self.mtime_ns: int = mtime_ns
+        self.size: int = size
+
+
+def scan_files(root: str) -> list[SiteEntry]:
+    entries: list[SiteEntry] = []
+    if not os.path.isdir(root):
+        return entries
+
+    # One scandir pass: directory entries carry their type, so only files cost a stat call
+    stack = [(root, "")]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        with os.scandir(dir_path) as dir_entries:
+            for entry in dir_entries:
+                rel_path = rel_dir + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, rel_path + "/"))
+                elif entry.is_file():
+                    stat = entry.stat()
+                    entries.append(SiteEntry(entry.path, rel_path, stat.st_mtime_ns, stat.st_size))
+
+    entries.sort(key=lambda entry: entry.rel_path)
+    return entries
+
+
+class SiteIndex:
+    def __init__(self, content_dir: str, dest_dir: str, pages: list[SitePage]) -> None:
+        self.content_dir: str = content_dir
+        self.dest_dir: str = dest_dir
+        self.pages: list[SitePage] = pages
+
+    @staticmethod
+    def build(content_dir: str, dest_dir: str) -> SiteIndex:
+        pages: list[SitePage] = []
+        for entry in scan_files(content_dir):
+            stem, extension = os.path.splitext(entry.rel_path)
+            if extension == ".md":
+                pages.append(SitePage(entry.path, os.path.join(dest_dir, stem + ".html"), entry.rel_path, entry.mtime_ns, entry.size))
+        return SiteIndex(content_dir, dest_dir, pages)
+
+    def tasks(self) -> list[tuple[str, str]]:
+        return [(page.source_path, page.output_path) for page in self.pages]
+
+    def by_source(self) -> dict[str, SitePage]:
+        return {page.source_path: page for page in self.pages}
+
+    def output_dirs(self) -> list[str]:
+        return sorted({os.path.dirname(page.output_path) for page in self.pages})
+
+    def shard(self, index: int, count: int) -> SiteIndex:
+        return SiteIndex(self.content_dir, self.dest_dir, [page for page in self.pages if shard_of(page.rel_path, count) == index])
+
+    def digest(self) -> str:
+        return hashlib.sha256("\0".join(page.rel_path for page in self.pages).encode()).hexdigest()
+
+
+def shard_of(rel_path: str, count: int) -> int:
+    # crc32 of the relative path is stable across machines, Python versions and hash seeds
+    return zlib.crc32(rel_path.replace(os.sep, "/").encode()) % count
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    index, _, count = value.partition("/")
+    if not index.isdigit() or not count.isdigit() or not 0 <= int(index) < int(count):
+        import argparse
+
+        # argparse only shows this message for its own error type, not for a ValueError
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N with 0 <= i < N, got {value}")
+    return int(index), int(count)
@@ -1,7 +1,149 @@
+import json
 import shutil
 import os
 
-def copy_static_to_dir(target_dir: str):
-    if os.path.exists(target_dir):
+from manifest import CACHE_DIR, atomic_path, atomic_write, hash_file, remove_empty_dirs
+
+STATIC_MANIFEST_PATH = os.path.join(CACHE_DIR, "static_manifest.json")
+COMPARE_MODES = ("mtime", "hash")
+PLACEMENT_MODES = ("copy", "hardlink", "reflink")
+# Linux FICLONE ioctl, shares extents on btrfs/xfs instead of copying data
+FICLONE = 0x40049409
+
+def copy_static_to_dir(target_dir: str, clean: bool = True, minify: bool = False, source_dir: str = "static"):
+    if clean and os.path.exists(target_dir):
         shutil.rmtree(target_dir)
-    _ = shutil.copytree("static", target_dir)
+    _ = shutil.copytree(source_dir, target_dir, dirs_exist_ok=True)
+    if minify:
+        for rel_path in list_files(source_dir):
+            if rel_path.endswith(".css"):
+                _ = place_file(static_source(os.path.join(source_dir, rel_path), minify), os.path.join(target_dir, rel_path))
+
+
+class SyncResult:
+    def __init__(self) -> None:
+        self.copied: list[str] = []
+        self.removed: list[str] = []
+        self.unchanged: list[str] = []
+
+
+def list_files(root: str) -> list[str]:
+    files: list[str] = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            files.append(os.path.relpath(os.path.join(dir_path, file_name), root))
+    return files
+
+
+def static_source(source_path: str, minify: bool = False, cache_dir: str | None = None) -> str:
+    # Minified stylesheets are placed from the cache, so unchanged ones compare equal to their target
+    if minify and source_path.endswith(".css"):
+        from minify import MINIFIED_CSS_DIR, minified_css_path
+
+        return minified_css_path(source_path, cache_dir if cache_dir is not None else MINIFIED_CSS_DIR)
+    return source_path
+
+
+def reflink_file(source_path: str, target_path: str):
+    import fcntl
+
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        _ = fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    shutil.copystat(source_path, target_path)
+
+
+def place_file(source_path: str, target_path: str, placement: str = "copy") -> str:
+    os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+
+    # Never write through an existing target: with hardlinks it may be the source file itself
+    placed = "copy"
+    with atomic_path(target_path) as tmp_path:
+        if placement == "hardlink":
+            try:
+                os.link(source_path, tmp_path)
+                placed = "hardlink"
+            except OSError:
+                pass
+        elif placement == "reflink":
+            try:
+                reflink_file(source_path, tmp_path)
+                placed = "reflink"
+            except (OSError, ImportError):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        if placed == "copy":
+            _ = shutil.copy2(source_path, tmp_path)
+    return placed
+
+
+def is_unchanged(source_path: str, target_path: str, record: dict[str, int | str] | None, compare: str) -> tuple[bool, str | None]:
+    try:
+        source_stat = os.stat(source_path)
+        target_stat = os.stat(target_path)
+    except FileNotFoundError:
+        return False, None
+
+    if source_stat.st_ino == target_stat.st_ino and source_stat.st_dev == target_stat.st_dev:
+        return True, None
+
+    if compare == "hash":
+        source_hash = hash_file(source_path)
+        # The recorded target stat catches files edited in the output tree behind our back
+        unchanged = record is not None and record.get("hash") == source_hash \
+            and record.get("size") == target_stat.st_size and record.get("mtime_ns") == target_stat.st_mtime_ns
+        return unchanged, source_hash
+
+    return source_stat.st_size == target_stat.st_size and source_stat.st_mtime_ns == target_stat.st_mtime_ns, None
+
+
+def sync_static_to_dir(target_dir: str, source_dir: str = "static", compare: str = "mtime", placement: str = "copy", manifest_path: str = STATIC_MANIFEST_PATH, minify: bool = False) -> SyncResult:
+    if compare not in COMPARE_MODES:
+        raise ValueError(f"Unknown compare mode {compare}")
+    if placement not in PLACEMENT_MODES:
+        raise ValueError(f"Unknown placement mode {placement}")
+
+    old_files: dict[str, dict[str, int | str]] = {}
+    try:
+        with open(manifest_path, "r") as f:
+            data = json.load(f)
+        if data.get("target_dir") == target_dir and data.get("source_dir") == source_dir:
+            old_files = data["files"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    result = SyncResult()
+    minified_dir = os.path.join(os.path.dirname(manifest_path), "minified")
+    new_files: dict[str, dict[str, int | str]] = {}
+
+    for rel_path in list_files(source_dir):
+        source_path = static_source(os.path.join(source_dir, rel_path), minify, minified_dir)
+        target_path = os.path.join(target_dir, rel_path)
+
+        unchanged, source_hash = is_unchanged(source_path, target_path, old_files.get(rel_path), compare)
+        if unchanged:
+            result.unchanged.append(rel_path)
+        else:
+            _ = place_file(source_path, target_path, placement)
+            result.copied.append(rel_path)
+
+        target_stat = os.stat(target_path)
+        new_files[rel_path] = {"size": target_stat.st_size, "mtime_ns": target_stat.st_mtime_ns}
+        if compare == "hash":
+            new_files[rel_path]["hash"] = source_hash if source_hash is not None else hash_file(source_path)
+
+    # Only files this sync placed are ours to remove; generated pages share the tree
+    for rel_path in old_files:
+        if rel_path in new_files:
+            continue
+        target_path = os.path.join(target_dir, rel_path)
+        if os.path.exists(target_path):
+            os.remove(target_path)
+            result.removed.append(rel_path)
+            remove_empty_dirs(os.path.dirname(target_path), target_dir)
+
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    atomic_write(manifest_path, json.dumps({"target_dir": target_dir, "source_dir": source_dir, "files": new_files}, indent=1, sort_keys=True))
+
+    return result
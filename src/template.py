@@ -0,0 +1,70 @@
+from enum import Enum
+from functools import lru_cache
+import os
+import re
+from typing import TextIO
+
+from htmlnode import HTMLNode
+
+TEMPLATE_SLOT = re.compile(r"\{\{ (Title|Content) \}\}")
+
+class Slot(Enum):
+    TITLE = "Title"
+    CONTENT = "Content"
+
+def prefix_basepath(html: str, basepath: str) -> str:
+    if basepath == "/":
+        return html
+    return html.replace("href=\"/", f"href=\"{basepath}").replace("src=\"/", f"src=\"{basepath}")
+
+def prefix_url(url: str | None, basepath: str) -> str | None:
+    if url is None or basepath == "/" or not url.startswith("/"):
+        return url
+    return basepath + url[1:]
+
+
+class Template:
+    def __init__(self, segments: list[str | Slot]) -> None:
+        self.segments: list[str | Slot] = segments
+
+    @staticmethod
+    def compile(template_content: str, basepath: str = "/") -> Template:
+        segments: list[str | Slot] = []
+        position = 0
+
+        # Basepath prefixing happens here, once per build, rather than over every rendered page
+        for match in TEMPLATE_SLOT.finditer(template_content):
+            if match.start() > position:
+                segments.append(prefix_basepath(template_content[position:match.start()], basepath))
+            segments.append(Slot(match.group(1)))
+            position = match.end()
+
+        if position < len(template_content):
+            segments.append(prefix_basepath(template_content[position:], basepath))
+
+        return Template(segments)
+
+    def render(self, values: dict[Slot, str]) -> str:
+        return "".join(segment if isinstance(segment, str) else values[segment] for segment in self.segments)
+
+    def write(self, stream: TextIO, values: dict[Slot, str | HTMLNode]) -> None:
+        for segment in self.segments:
+            if isinstance(segment, str):
+                _ = stream.write(segment)
+                continue
+
+            value = values[segment]
+            if isinstance(value, str):
+                _ = stream.write(value)
+            else:
+                value.write_html(stream)
+
+
+@lru_cache(maxsize=8)
+def _compile_template_file(template_path: str, basepath: str, mtime_ns: int) -> Template:
+    with open(template_path, "r") as f:
+        return Template.compile(f.read(), basepath)
+
+def load_template(template_path: str, basepath: str = "/") -> Template:
+    # Keyed on mtime so a long-running process picks up template edits
+    return _compile_template_file(template_path, basepath, os.stat(template_path).st_mtime_ns)
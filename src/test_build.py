@@ -0,0 +1,842 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import struct
+import tempfile
+import unittest
+
+from statics import sync_static_to_dir
+from serve import SiteWatcher
+import page_generation
+from profiling import Profiler
+from textnode import TextNode
+from fragment_cache import FragmentCache, open_fragment_cache
+from page_generation import RenderOptions, generate_page, generate_pages_recursive
+from bench import CorpusSpec, generate_corpus, load_corpus, parse_importtime
+from page_generation import generate_pages_incremental, generate_pages_parallel
+from site_index import SiteIndex, parse_shard, shard_of
+from merge import merge_shards, shard_dir, write_shard_manifest
+from postbuild import post_build
+from search_index import build_search_index
+from image_index import ImageIndex, read_image_size
+from link_check import check_links
+from metadata import SiteMetadata, read_page_head
+from listings import build_listings
+from deploy import stage_changes, update_deploy_manifest
+from manifest import atomic_path, atomic_write
+
+TEMPLATE = "<html><title>{{ Title }}</title><body>{{ Content }}</body></html>"
+
+
+class BuildTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.dest = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        self.manifest = os.path.join(self.root, "cache", "manifest.json")
+        os.makedirs(os.path.join(self.content, "subdir"))
+        os.makedirs(self.dest)
+        self.write(self.template, TEMPLATE)
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n[Sub](/subdir)")
+        self.write(os.path.join(self.content, "subdir", "index.md"), "# Sub\n\nSome **text**")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path: str, text: str):
+        with open(path, "w") as f:
+            _ = f.write(text)
+
+    def read(self, path: str) -> str:
+        with open(path, "r") as f:
+            return f.read()
+
+
+class TestIncrementalBuild(BuildTestCase):
+    def build(self, basepath: str = "/") -> list[str]:
+        return generate_pages_incremental(self.content, self.template, self.dest, basepath, self.manifest).rendered
+
+    def test_first_build_renders_everything(self):
+        self.assertEqual(len(self.build()), 2)
+        self.assertIn("<b>text</b>", self.read(os.path.join(self.dest, "subdir", "index.html")))
+
+    def test_unchanged_build_renders_nothing(self):
+        _ = self.build()
+        self.assertEqual(self.build(), [])
+
+    def test_only_changed_page_is_rendered(self):
+        _ = self.build()
+        self.write(os.path.join(self.content, "subdir", "index.md"), "# Sub\n\nEdited")
+        self.assertEqual(self.build(), [os.path.join(self.content, "subdir", "index.md")])
+        self.assertIn("Edited", self.read(os.path.join(self.dest, "subdir", "index.html")))
+
+    def test_removed_source_deletes_output(self):
+        _ = self.build()
+        os.remove(os.path.join(self.content, "subdir", "index.md"))
+        self.assertEqual(self.build(), [])
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "subdir")))
+
+    def test_template_change_rebuilds_everything(self):
+        _ = self.build()
+        self.write(self.template, "<main>" + TEMPLATE + "</main>")
+        self.assertEqual(len(self.build()), 2)
+
+    def test_basepath_change_rebuilds_everything(self):
+        _ = self.build()
+        self.assertEqual(len(self.build("/site/")), 2)
+        self.assertIn('href="/site/subdir"', self.read(os.path.join(self.dest, "index.html")))
+
+    def test_missing_output_is_rendered_again(self):
+        _ = self.build()
+        os.remove(os.path.join(self.dest, "index.html"))
+        self.assertEqual(self.build(), [os.path.join(self.content, "index.md")])
+
+    def test_failed_page_is_retried(self):
+        self.write(os.path.join(self.content, "broken.md"), "No heading")
+        result = generate_pages_incremental(self.content, self.template, self.dest, "/", self.manifest)
+        self.assertEqual([source for source, _ in result.errors], [os.path.join(self.content, "broken.md")])
+        self.assertEqual(self.build(), [])
+        self.write(os.path.join(self.content, "broken.md"), "# Fixed")
+        self.assertEqual(self.build(), [os.path.join(self.content, "broken.md")])
+
+
+class TestBuildModes(BuildTestCase):
+    def run_main(self, *args: str):
+        from unittest import mock
+
+        import main
+
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        try:
+            with mock.patch("sys.argv", ["main.py", *args, "--no-image-sizes"]):
+                main.main()
+        finally:
+            os.chdir(cwd)
+
+    def test_full_build_resets_incremental_state(self):
+        os.makedirs(os.path.join(self.root, "static"))
+        self.write(os.path.join(self.root, "static", "index.css"), "body {}")
+        self.run_main("/", "--incremental")
+        self.run_main("/site/")
+        # Pages the full build rewrote for /site/ must not look up to date to the next incremental run
+        self.run_main("/", "--incremental")
+        self.assertIn('href="/subdir"', self.read(os.path.join(self.dest, "index.html")))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "index.css")))
+
+
+class TestParallelBuild(BuildTestCase):
+    def read_tree(self, root: str) -> dict[str, str]:
+        files: dict[str, str] = {}
+        for dir_path, _, file_names in os.walk(root):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                files[os.path.relpath(path, root)] = self.read(path)
+        return files
+
+    def test_parallel_output_matches_serial(self):
+        for i in range(6):
+            self.write(os.path.join(self.content, f"page{i}.md"), f"# Page {i}\n\n- item [link](/page{i})")
+
+        serial = generate_pages_parallel(self.content, self.template, os.path.join(self.root, "serial"), "/base/", 1)
+        parallel = generate_pages_parallel(self.content, self.template, os.path.join(self.root, "parallel"), "/base/", 3)
+
+        self.assertEqual(serial.rendered, parallel.rendered)
+        self.assertEqual(self.read_tree(os.path.join(self.root, "serial")), self.read_tree(os.path.join(self.root, "parallel")))
+
+    def test_errors_are_collected_per_file(self):
+        self.write(os.path.join(self.content, "broken.md"), "No heading here")
+        result = generate_pages_parallel(self.content, self.template, self.dest, "/", 2)
+
+        self.assertEqual(len(result.rendered), 2)
+        self.assertEqual(result.errors, [(os.path.join(self.content, "broken.md"), "Exception: No title found")])
+
+
+class TestAtomicWrite(BuildTestCase):
+    def test_failed_write_keeps_the_old_file(self):
+        path = os.path.join(self.root, "out.txt")
+        atomic_write(path, "old")
+        with self.assertRaises(RuntimeError):
+            with atomic_path(path) as tmp_path:
+                self.write(tmp_path, "torn")
+                raise RuntimeError
+        self.assertEqual(self.read(path), "old")
+        atomic_write(path, b"new")
+        self.assertEqual(self.read(path), "new")
+        self.assertFalse([name for name in os.listdir(self.root) if name.endswith(".tmp")])
+
+
+class TestStaticSync(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        self.static_manifest = os.path.join(self.root, "cache", "static.json")
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(os.path.join(self.static, "images", "a.png"), "png")
+
+    def sync(self, compare: str = "mtime", placement: str = "copy", minify: bool = False):
+        return sync_static_to_dir(self.dest, self.static, compare, placement, self.static_manifest, minify)
+
+    def test_only_changed_assets_are_copied(self):
+        self.assertEqual(self.sync("hash").copied, ["index.css", "images/a.png"])
+        self.assertEqual(self.sync("hash").copied, [])
+
+        self.write(os.path.join(self.static, "index.css"), "body { color: red }")
+        self.assertEqual(self.sync("hash").copied, ["index.css"])
+        self.assertEqual(self.read(os.path.join(self.dest, "index.css")), "body { color: red }")
+
+    def test_mtime_compare_skips_copied_assets(self):
+        self.assertEqual(self.sync().unchanged, [])
+        self.assertEqual(self.sync().unchanged, ["index.css", "images/a.png"])
+
+    def test_removed_assets_are_deleted_without_touching_pages(self):
+        _ = self.sync()
+        self.write(os.path.join(self.dest, "index.html"), "page")
+        os.remove(os.path.join(self.static, "images", "a.png"))
+
+        self.assertEqual(self.sync().removed, ["images/a.png"])
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "images")))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "index.html")))
+
+    def test_minified_stylesheets_are_cached_by_content(self):
+        self.write(os.path.join(self.static, "index.css"), "body {\n  color: red;\n}\n")
+        self.assertEqual(self.sync(minify=True).copied, ["index.css", "images/a.png"])
+        self.assertEqual(self.read(os.path.join(self.dest, "index.css")), "body{color:red}")
+        self.assertEqual(self.sync(minify=True).copied, [])
+
+    def test_hardlink_placement_shares_the_source_inode(self):
+        _ = self.sync(placement="hardlink")
+        target = os.path.join(self.dest, "index.css")
+        self.assertTrue(os.path.samefile(target, os.path.join(self.static, "index.css")))
+        self.assertEqual(self.sync(placement="hardlink").copied, [])
+
+
+class TestSiteWatcher(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        os.makedirs(self.static)
+        self.watcher = SiteWatcher(self.content, self.static, self.template, self.dest)
+
+    def touch(self, path: str, text: str):
+        self.write(path, text)
+        # Make sure the change is visible even on filesystems with coarse mtimes
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_no_changes_means_no_rebuild(self):
+        self.assertFalse(self.watcher.poll())
+
+    def test_edited_page_is_rendered(self):
+        self.touch(os.path.join(self.content, "subdir", "index.md"), "# Sub\n\nLive edit")
+        self.assertTrue(self.watcher.poll())
+        self.assertIn("Live edit", self.read(os.path.join(self.dest, "subdir", "index.html")))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "index.html")))
+
+    def test_removed_page_and_asset_are_deleted(self):
+        self.touch(os.path.join(self.static, "a.css"), "a {}")
+        self.assertTrue(self.watcher.poll())
+        self.assertEqual(self.read(os.path.join(self.dest, "a.css")), "a {}")
+
+        os.remove(os.path.join(self.static, "a.css"))
+        self.touch(os.path.join(self.content, "subdir", "index.md"), "# Sub")
+        self.assertTrue(self.watcher.poll())
+        os.remove(os.path.join(self.content, "subdir", "index.md"))
+        self.assertTrue(self.watcher.poll())
+
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "a.css")))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "subdir")))
+
+    def test_resized_image_renders_only_pages_showing_it(self):
+        gif = lambda width: b"GIF89a" + struct.pack("<HH", width, 34) + b"\x00" * 16
+        with open(os.path.join(self.static, "a.gif"), "wb") as f:
+            _ = f.write(gif(12))
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n![A](/a.gif)")
+        self.watcher = SiteWatcher(self.content, self.static, self.template, self.dest, options=RenderOptions(images=ImageIndex.build(self.static, "/", os.path.join(self.root, "images.json"))))
+
+        with open(os.path.join(self.static, "a.gif"), "wb") as f:
+            _ = f.write(gif(56))
+        stat = os.stat(os.path.join(self.static, "a.gif"))
+        os.utime(os.path.join(self.static, "a.gif"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertTrue(self.watcher.poll())
+        self.assertIn('width="56"', self.read(os.path.join(self.dest, "index.html")))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "subdir", "index.html")))
+        # The refresh updates the index the watcher was given, not the one under the working directory
+        with open(os.path.join(self.root, "images.json"), "r") as f:
+            self.assertEqual(json.load(f)["a.gif"]["width"], 56)
+
+    def test_template_change_renders_every_page(self):
+        self.touch(self.template, "<main>{{ Content }}</main>")
+        self.assertTrue(self.watcher.poll())
+        self.assertTrue(self.read(os.path.join(self.dest, "index.html")).startswith("<main>"))
+        self.assertTrue(self.read(os.path.join(self.dest, "subdir", "index.html")).startswith("<main>"))
+
+
+class TestStreamingRender(BuildTestCase):
+    def test_large_source_renders_in_bounded_memory(self):
+        import tracemalloc
+
+        source = os.path.join(self.root, "large.md")
+        paragraph = "Plain streamed text. " * 100
+        with open(source, "w") as f:
+            _ = f.write("# Large\n\n")
+            for i in range(1000):
+                _ = f.write(f"## Section {i}\n\n{paragraph}\n\n- a\n- b\n\n")
+        dest = os.path.join(self.root, "large.html")
+
+        tracemalloc.start()
+        try:
+            _ = generate_page(source, self.template, dest)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        self.assertGreater(os.path.getsize(source), 2_000_000)
+        self.assertLess(peak, 512 * 1024)
+        self.assertTrue(self.read(dest).endswith("<ul><li>a</li><li>b</li></ul></div></body></html>"))
+
+
+class TestBenchCorpus(BuildTestCase):
+    def test_corpus_is_deterministic_and_builds(self):
+        spec = CorpusSpec(pages=12, depth=2, fanout=3, seed=7)
+        first = load_corpus(generate_corpus(os.path.join(self.root, "a"), spec))
+        second = load_corpus(generate_corpus(os.path.join(self.root, "b"), spec))
+        self.assertEqual(len(first), 12)
+        self.assertEqual(first, second)
+
+        result = generate_pages_parallel(os.path.join(self.root, "a", "content"), os.path.join(self.root, "a", "template.html"), self.dest)
+        self.assertEqual((len(result.rendered), result.errors), (12, []))
+
+
+class TestProfiler(BuildTestCase):
+    def test_profile_records_stages_and_pages(self):
+        original_generate_page = page_generation.generate_page
+        original_nodes_from_text = TextNode.nodes_from_text
+        profiler = Profiler()
+        profiler.install()
+        try:
+            _ = generate_pages_parallel(self.content, self.template, self.dest)
+        finally:
+            profiler.uninstall()
+
+        self.assertIs(page_generation.generate_page, original_generate_page)
+        self.assertIs(TextNode.nodes_from_text, original_nodes_from_text)
+
+        report = profiler.report()
+        self.assertEqual(set(report["stages"]), {"page", "title_scan", "blocks", "inline", "stream"})
+        self.assertEqual(report["stages"]["page"]["calls"], 2)
+        self.assertEqual({page["page"] for page in report["pages"]}, {os.path.join(self.content, "index.md"), os.path.join(self.content, "subdir", "index.md")})
+        self.assertEqual(len(profiler.chrome_trace()["traceEvents"]), len(profiler.spans))
+
+
+class TestFragmentCache(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_path = os.path.join(self.root, "cache", "fragments.sqlite")
+
+    def test_cached_build_matches_uncached_build(self):
+        footer = "\n\n> Shared footer with a [link](/about)"
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n[Sub](/subdir)" + footer)
+        self.write(os.path.join(self.content, "subdir", "index.md"), "# Sub\n\nSome **text**" + footer)
+
+        plain = generate_pages_parallel(self.content, self.template, os.path.join(self.root, "plain"), "/base/")
+        options = RenderOptions(self.cache_path)
+        cached = generate_pages_parallel(self.content, self.template, os.path.join(self.root, "cached"), "/base/", 1, options)
+        self.assertEqual((plain.errors, cached.errors), ([], []))
+
+        cache = open_fragment_cache(self.cache_path)
+        # The footer is rendered once and reused by the second page
+        self.assertEqual(cache.hits, 1)
+
+        for page in ("index.html", os.path.join("subdir", "index.html")):
+            self.assertEqual(self.read(os.path.join(self.root, "plain", page)), self.read(os.path.join(self.root, "cached", page)))
+
+    def test_fragments_persist_across_runs(self):
+        cache = FragmentCache(self.cache_path)
+        cache.put(FragmentCache.key("paragraph", "text", "/"), "<p>text</p>")
+        cache.close()
+
+        reopened = FragmentCache(self.cache_path)
+        self.assertEqual(reopened.get(FragmentCache.key("paragraph", "text", "/")), "<p>text</p>")
+        self.assertIsNone(reopened.get(FragmentCache.key("paragraph", "text", "/other/")))
+        reopened.close()
+
+    def test_eviction_keeps_most_recently_used(self):
+        cache = FragmentCache(self.cache_path)
+        for i in range(20):
+            cache.put(f"key{i}", f"<p>{i}</p>" * 50)
+            cache.stamp += 1
+            cache.flush()
+
+        budget = cache.total_bytes() // 2
+        self.assertGreater(cache.evict(budget), 0)
+        self.assertLessEqual(cache.total_bytes(), budget)
+        cache.memory.clear()
+        self.assertIsNotNone(cache.get("key19"))
+        self.assertIsNone(cache.get("key0"))
+        cache.close()
+
+
+class TestSiteIndex(BuildTestCase):
+    def test_pages_are_indexed_in_path_order(self):
+        self.write(os.path.join(self.content, "notes.txt"), "not a page")
+        self.write(os.path.join(self.content, "about.md"), "# About")
+        site = SiteIndex.build(self.content, self.dest)
+        self.assertEqual([page.rel_path for page in site.pages], ["about.md", "index.md", "subdir/index.md"])
+        self.assertEqual(site.tasks()[2], (os.path.join(self.content, "subdir", "index.md"), os.path.join(self.dest, "subdir", "index.html")))
+
+    def test_pages_carry_stat_info(self):
+        source_path = os.path.join(self.content, "index.md")
+        page = SiteIndex.build(self.content, self.dest).by_source()[source_path]
+        self.assertEqual((page.mtime_ns, page.size), (os.stat(source_path).st_mtime_ns, os.path.getsize(source_path)))
+
+    def test_touched_but_identical_source_is_not_rendered(self):
+        _ = generate_pages_incremental(self.content, self.template, self.dest, "/", self.manifest)
+        source_path = os.path.join(self.content, "index.md")
+        os.utime(source_path, ns=(1, 1))
+        self.assertEqual(generate_pages_incremental(self.content, self.template, self.dest, "/", self.manifest).rendered, [])
+
+    def test_minify_setting_rebuilds_every_page(self):
+        _ = generate_pages_incremental(self.content, self.template, self.dest, "/", self.manifest)
+        rendered = generate_pages_incremental(self.content, self.template, self.dest, "/", self.manifest, options=RenderOptions(minify=True)).rendered
+        self.assertEqual(len(rendered), 2)
+
+    def test_default_build_is_quiet(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            result = generate_pages_parallel(self.content, self.template, self.dest)
+        self.assertEqual(len(result.rendered), 2)
+        self.assertEqual(stdout.getvalue(), "")
+
+
+class TestPostBuild(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        self.postbuild_manifest = os.path.join(self.root, "cache", "postbuild.json")
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write(os.path.join(self.static, "index.css"), "body { background: url('/images/a.png'); }")
+        self.write(os.path.join(self.static, "images", "a.png"), "png")
+        self.write(self.template, '<html><link href="/index.css"><title>{{ Title }}</title><body>{{ Content }}</body></html>')
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n![Alt](/images/a.png)")
+
+    def build(self, fingerprint: bool = True, compress: bool = False):
+        _ = sync_static_to_dir(self.dest, self.static, manifest_path=os.path.join(self.root, "cache", "static.json"))
+        _ = generate_pages_incremental(self.content, self.template, self.dest, "/", self.manifest)
+        return post_build(self.dest, self.static, "/", fingerprint, compress, manifest_path=self.postbuild_manifest)
+
+    def test_pages_and_stylesheets_point_at_hashed_assets(self):
+        result = self.build()
+        css_name, image_name = result.fingerprinted["index.css"], result.fingerprinted["images/a.png"]
+        self.assertRegex(image_name, r"^images/a\.[0-9a-f]{10}\.png$")
+        html = self.read(os.path.join(self.dest, "index.html"))
+        self.assertIn(f'href="/{css_name}"', html)
+        self.assertIn(f'src="/{image_name}"', html)
+        self.assertIn(f"url('/{image_name}')", self.read(os.path.join(self.dest, css_name)))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "index.css")))
+
+    def test_changed_asset_updates_unchanged_pages(self):
+        old_name = self.build().fingerprinted["images/a.png"]
+        self.write(os.path.join(self.static, "images", "a.png"), "new png")
+        result = self.build()
+        new_name = result.fingerprinted["images/a.png"]
+        self.assertNotEqual(old_name, new_name)
+        self.assertIn(f'src="/{new_name}"', self.read(os.path.join(self.dest, "index.html")))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, old_name)))
+
+    def test_precompression_skips_unchanged_files(self):
+        import gzip
+
+        result = self.build(fingerprint=False, compress=True)
+        self.assertIn("index.html", result.compressed)
+        with gzip.open(os.path.join(self.dest, "index.html.gz"), "rt") as f:
+            self.assertEqual(f.read(), self.read(os.path.join(self.dest, "index.html")))
+        self.assertEqual(self.build(fingerprint=False, compress=True).compressed, [])
+
+        os.remove(os.path.join(self.content, "subdir", "index.md"))
+        result = self.build(fingerprint=False, compress=True)
+        self.assertIn(os.path.join("subdir", "index.html.gz"), result.removed)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "subdir")))
+
+
+class TestImageIndex(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        self.index_path = os.path.join(self.root, "cache", "images.json")
+        os.makedirs(os.path.join(self.static, "images"))
+
+    def write_bytes(self, rel_path: str, data: bytes) -> str:
+        path = os.path.join(self.static, rel_path)
+        with open(path, "wb") as f:
+            _ = f.write(data)
+        return path
+
+    def test_headers(self):
+        png = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + struct.pack(">II", 640, 480) + b"\x08\x06\x00\x00\x00"
+        gif = b"GIF89a" + struct.pack("<HH", 12, 34) + b"\x00" * 16
+        jpeg = b"\xff\xd8\xff\xe1" + struct.pack(">H", 6) + b"Exif" + b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 200, 300) + b"\x00" * 10
+        vp8x = b"RIFF\x00\x00\x00\x00WEBPVP8X\x0a\x00\x00\x00\x00\x00\x00\x00" + (299).to_bytes(3, "little") + (374).to_bytes(3, "little")
+        vp8l = b"RIFF\x00\x00\x00\x00WEBPVP8L\x00\x00\x00\x00\x2f" + struct.pack("<I", (99 << 14) | 49)
+        vp8 = b"RIFF\x00\x00\x00\x00WEBPVP8 \x00\x00\x00\x00\x00\x00\x00\x9d\x01\x2a" + struct.pack("<HH", 64, 32)
+        for data, size in [(png, (640, 480)), (gif, (12, 34)), (jpeg, (300, 200)), (vp8x, (300, 375)), (vp8l, (50, 100)), (vp8, (64, 32))]:
+            self.assertEqual(read_image_size(self.write_bytes("image", data + b"\x00" * 8)), size)
+        self.assertIsNone(read_image_size(self.write_bytes("image", b"not an image")))
+
+    def test_img_tags_get_sizes(self):
+        _ = self.write_bytes("images/a.gif", b"GIF89a" + struct.pack("<HH", 12, 34) + b"\x00" * 16)
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n![A](/images/a.gif) ![B](/images/missing.gif)")
+        images = ImageIndex.build(self.static, "/", self.index_path)
+        _ = generate_pages_parallel(self.content, self.template, self.dest, options=RenderOptions(images=images))
+        html = self.read(os.path.join(self.dest, "index.html"))
+        self.assertIn('<img src="/images/a.gif" alt="A" width="12" height="34">', html)
+        self.assertIn('<img src="/images/missing.gif" alt="B">', html)
+
+    def test_unchanged_content_reuses_cached_size(self):
+        path = self.write_bytes("images/a.gif", b"GIF89a" + struct.pack("<HH", 12, 34) + b"\x00" * 16)
+        _ = ImageIndex.build(self.static, "/", self.index_path)
+        os.utime(path, ns=(1, 1))
+        with open(self.index_path, "r") as f:
+            records = json.load(f)
+        records["images/a.gif"]["width"] = 99
+        with open(self.index_path, "w") as f:
+            json.dump(records, f)
+        # Same hash, so the recorded size is trusted instead of the header being parsed again
+        self.assertEqual(ImageIndex.build(self.static, "/", self.index_path).sizes["/images/a.gif"], (99, 34))
+
+    def test_cached_fragments_follow_image_sizes(self):
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n![A](/images/a.gif)")
+        options = RenderOptions(os.path.join(self.root, "cache", "fragments.sqlite"))
+        for width in (12, 56):
+            _ = self.write_bytes("images/a.gif", b"GIF89a" + struct.pack("<HH", width, 34) + b"\x00" * 16)
+            options.images = ImageIndex.build(self.static, "/", self.index_path)
+            _ = generate_pages_parallel(self.content, self.template, self.dest, options=options)
+            self.assertIn(f'width="{width}"', self.read(os.path.join(self.dest, "index.html")))
+
+    def test_only_pages_showing_a_resized_image_are_rebuilt(self):
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n![A](/images/a.gif)")
+        options = RenderOptions(os.path.join(self.root, "cache", "fragments.sqlite"))
+        gif = lambda width: b"GIF89a" + struct.pack("<HH", width, 34) + b"\x00" * 16
+
+        def build() -> list[str]:
+            options.images = ImageIndex.build(self.static, "/", self.index_path)
+            return generate_pages_incremental(self.content, self.template, self.dest, "/", self.manifest, options=options).rendered
+
+        _ = self.write_bytes("images/a.gif", gif(12))
+        self.assertEqual(len(build()), 2)
+        # An image no page shows changes nothing, not even the cached fragments
+        _ = self.write_bytes("images/b.gif", gif(20))
+        self.assertEqual(build(), [])
+        _ = self.write_bytes("images/a.gif", gif(56))
+        self.assertEqual(build(), [os.path.join(self.content, "index.md")])
+        self.assertIn('width="56"', self.read(os.path.join(self.dest, "index.html")))
+
+
+class TestShardedBuild(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        os.makedirs(self.static)
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        for i in range(10):
+            self.write(os.path.join(self.content, f"page{i}.md"), f"# Page {i}")
+
+    def build_shard(self, index: int, count: int) -> str:
+        target = shard_dir(self.dest, index, count)
+        os.makedirs(target)
+        site = SiteIndex.build(self.content, target)
+        shard = site.shard(index, count)
+        result = generate_pages_parallel(self.content, self.template, target, site=shard)
+        write_shard_manifest(site, shard, index, count, {source_path for source_path, _ in result.errors})
+        return target
+
+    def test_shards_partition_the_site(self):
+        site = SiteIndex.build(self.content, self.dest)
+        shards = [site.shard(i, 3) for i in range(3)]
+        self.assertEqual(sorted(page.rel_path for shard in shards for page in shard.pages), [page.rel_path for page in site.pages])
+        self.assertEqual(shard_of("subdir/index.md", 3), shard_of("subdir/index.md", 3))
+        self.assertEqual(parse_shard("2/3"), (2, 3))
+        self.assertRaises(argparse.ArgumentTypeError, parse_shard, "3/3")
+
+    def test_merge_matches_single_build(self):
+        shards = [self.build_shard(i, 3) for i in range(3)]
+        merged_dir = os.path.join(self.root, "merged")
+        self.assertEqual(merge_shards(shards, merged_dir, self.static), 12)
+
+        _ = generate_pages_parallel(self.content, self.template, self.dest)
+        for page in SiteIndex.build(self.content, self.dest).pages:
+            self.assertEqual(self.read(os.path.join(merged_dir, os.path.relpath(page.output_path, self.dest))), self.read(page.output_path))
+        self.assertTrue(os.path.exists(os.path.join(merged_dir, "index.css")))
+        self.assertFalse(os.path.exists(os.path.join(merged_dir, ".shard.json")))
+
+    def test_merge_rejects_missing_and_duplicate_shards(self):
+        shards = [self.build_shard(i, 3) for i in range(3)]
+        merged_dir = os.path.join(self.root, "merged")
+        self.assertRaisesRegex(Exception, "exactly once", merge_shards, shards[:2], merged_dir, self.static)
+        self.assertRaisesRegex(Exception, "exactly once", merge_shards, shards + shards[:1], merged_dir, self.static)
+        self.assertFalse(os.path.exists(merged_dir))
+
+    def test_merge_rejects_shards_with_failed_pages(self):
+        self.write(os.path.join(self.content, "broken.md"), "no title")
+        shards = [self.build_shard(i, 2) for i in range(2)]
+        self.assertRaisesRegex(Exception, "12 of 13 pages", merge_shards, shards, os.path.join(self.root, "merged"), self.static)
+
+
+class TestPipeline(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            self.write(os.path.join(self.content, f"page{i}.md"), f"# Page {i}\n\nSome   *text*\r\nand `code`\n\n```\n  kept\n```\n")
+
+    def build_both(self, **options) -> tuple[str, str]:
+        serial, piped = os.path.join(self.root, "serial"), os.path.join(self.root, "piped")
+        if options:
+            _ = generate_pages_parallel(self.content, self.template, serial, options=RenderOptions(**options))
+        else:
+            os.makedirs(serial)
+            generate_pages_recursive(self.content, self.template, serial, "/")
+        result = generate_pages_parallel(self.content, self.template, piped, options=RenderOptions(pipeline=3, **options))
+        self.assertEqual(result.errors, [])
+        return serial, piped
+
+    def assertSameTree(self, left: str, right: str):
+        for page in SiteIndex.build(self.content, left).pages:
+            with open(page.output_path, "rb") as f, open(os.path.join(right, os.path.relpath(page.output_path, left)), "rb") as g:
+                self.assertEqual(f.read(), g.read())
+
+    def test_output_matches_serial_build(self):
+        self.assertSameTree(*self.build_both())
+
+    def test_output_matches_with_minify_and_fragment_cache(self):
+        self.assertSameTree(*self.build_both(minify=True, fragment_cache_path=os.path.join(self.root, "cache", "fragments.sqlite")))
+
+    def test_errors_are_reported_in_task_order(self):
+        self.write(os.path.join(self.content, "broken.md"), "no title")
+        self.write(os.path.join(self.content, "zbroken.md"), "no title either")
+        result = generate_pages_parallel(self.content, self.template, self.dest, options=RenderOptions(pipeline=2))
+        self.assertEqual([source_path for source_path, _ in result.errors], [os.path.join(self.content, "broken.md"), os.path.join(self.content, "zbroken.md")])
+        self.assertEqual(len(result.rendered), 14)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "broken.html")))
+
+
+class TestSearchIndex(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.search_cache = os.path.join(self.root, "cache", "search.json")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nSome **bold** words and `code`, see [the docs](/docs)\n\n![A cat](/cat.png)")
+
+    def build(self):
+        return build_search_index(self.content, self.dest, "/", self.search_cache)
+
+    def load(self, name: str):
+        with open(os.path.join(self.dest, "search", name + ".json"), "r") as f:
+            return json.load(f)
+
+    def test_terms_are_sharded_by_prefix(self):
+        _ = self.build()
+        meta = self.load("index")
+        self.assertEqual(meta["pages"], [["/", "Home"], ["/subdir/", "Sub"]])
+        self.assertIn("bo", meta["shards"])
+        self.assertEqual(self.load("bo"), {"bold": [[0, 2]]})
+        self.assertEqual(self.load("co"), {"code": [[0, 5]]})
+        self.assertEqual(self.load("do"), {"docs": [[0, 8]]})
+        self.assertEqual(self.load("ca"), {"cat": [[0, 10]]})
+        self.assertEqual(self.load("so"), {"some": [[0, 1], [1, 1]]})
+
+    def test_only_changed_pages_and_shards_are_rewritten(self):
+        _ = self.build()
+        unchanged = self.build()
+        self.assertEqual((unchanged.indexed, unchanged.written), ([], []))
+
+        self.write(os.path.join(self.content, "subdir", "index.md"), "# Sub\n\nSome zebras")
+        result = self.build()
+        self.assertEqual(result.indexed, ["subdir/index.md"])
+        self.assertEqual(sorted(result.written), ["index", "ze"])
+        self.assertEqual(result.removed, ["te"])
+        self.assertEqual(self.load("ze"), {"zebras": [[1, 2]]})
+
+    def test_removed_pages_free_their_terms(self):
+        _ = self.build()
+        os.remove(os.path.join(self.content, "subdir", "index.md"))
+        result = self.build()
+        self.assertEqual(result.removed, ["su", "te"])
+        self.assertEqual(self.load("index")["pages"], [["/", "Home"]])
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "search", "te.json")))
+
+
+class TestLinkCheck(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write(os.path.join(self.static, "images", "cat.png"), "")
+        self.write(os.path.join(self.content, "subdir", "page.md"), "# Page\n\n[home](/) and [up](../subdir/)\n\n- [gone](/missing) item\n- ![cat](/images/cat.png)\n\n```\n[not a link](/nowhere)\n```\n\n[anchor](#top) [ext](https://example.com) ![dog](/images/dog.png)")
+
+    def check(self, result, basepath: str = "/"):
+        site = SiteIndex.build(self.content, self.dest)
+        return [(os.path.relpath(broken.source_path, self.content), broken.line, broken.kind, broken.target) for broken in check_links(result.refs, site, self.static, basepath)]
+
+    def test_broken_targets_are_reported_with_lines(self):
+        result = generate_pages_parallel(self.content, self.template, self.dest, options=RenderOptions(check_links=True))
+        self.assertEqual(self.check(result), [(os.path.join("subdir", "page.md"), 5, "link", "/missing"), (os.path.join("subdir", "page.md"), 12, "image", "/images/dog.png")])
+
+    def test_basepath_and_fragment_cache(self):
+        options = RenderOptions(fragment_cache_path=os.path.join(self.root, "cache", "fragments.sqlite"), check_links=True)
+        for _ in range(2):
+            result = generate_pages_parallel(self.content, self.template, self.dest, "/site/", options=options)
+            self.assertEqual([target for _, _, _, target in self.check(result, "/site/")], ["/site/missing", "/site/images/dog.png"])
+
+    def test_incremental_build_keeps_targets_of_skipped_pages(self):
+        options = RenderOptions(check_links=True)
+        _ = generate_pages_incremental(self.content, self.template, self.dest, manifest_path=self.manifest, options=options)
+        result = generate_pages_incremental(self.content, self.template, self.dest, manifest_path=self.manifest, options=options)
+        self.assertEqual(result.rendered, [])
+        self.assertEqual(len(self.check(result)), 2)
+
+        self.write(os.path.join(self.static, "images", "dog.png"), "")
+        self.assertEqual(len(self.check(result)), 1)
+
+    def test_pipeline_records_targets(self):
+        result = generate_pages_parallel(self.content, self.template, self.dest, options=RenderOptions(pipeline=2, check_links=True))
+        self.assertEqual(len(self.check(result)), 2)
+
+
+class TestListings(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.metadata_cache = os.path.join(self.root, "cache", "metadata.json")
+        self.listing_state = os.path.join(self.root, "cache", "listings.json")
+        for i, (date, tags) in enumerate([("2024-01-02", "[Go, python]"), ("2024-03-01", "python"), ("", "")]):
+            self.write(os.path.join(self.content, "subdir", f"post{i}.md"), f"---\ndate: {date}\ntags: {tags}\n---\n# Post {i}\n\nBody {i}")
+
+    def build(self, page_size: int = 2):
+        site = SiteIndex.build(self.content, self.dest)
+        return build_listings(SiteMetadata.build(site, self.metadata_cache), site, self.template, "/", page_size, state_path=self.listing_state)
+
+    def test_read_page_head_stops_at_the_title(self):
+        lines = iter(["---", "Title: From front matter", "order: 2", "---", "# Heading", "never read"])
+        head = read_page_head(lines)
+        self.assertEqual((head.title, head.fields["order"], head.body_start), ("From front matter", "2", 4))
+        self.assertEqual(next(lines), "# Heading")
+        self.assertEqual(read_page_head(["intro", "# Title", "## Sub"]).title, "Title")
+        # Without a closing fence the opening one is a horizontal rule, as before front matter existed
+        head = read_page_head(["---", "date: 2024", "# Title"])
+        self.assertEqual((head.title, head.fields, head.body_start), ("Title", {}, 0))
+
+    def test_page_without_body_or_closing_fence(self):
+        self.write(os.path.join(self.content, "rule.md"), "---\n\n# Rule\n\nText")
+        self.write(os.path.join(self.content, "empty.md"), "---\ntitle: Empty\n---\n")
+        result = generate_pages_parallel(self.content, self.template, self.dest)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(self.read(os.path.join(self.dest, "rule.html")), "<html><title>Rule</title><body><div><p>---</p><h1>Rule</h1><p>Text</p></div></body></html>")
+        self.assertEqual(self.read(os.path.join(self.dest, "empty.html")), "<html><title>Empty</title><body><div></div></body></html>")
+
+    def test_front_matter_is_not_rendered(self):
+        result = generate_pages_parallel(self.content, self.template, self.dest)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(self.read(os.path.join(self.dest, "subdir", "post0.html")), "<html><title>Post 0</title><body><div><h1>Post 0</h1><p>Body 0</p></div></body></html>")
+
+    def test_sections_and_tags_are_paginated(self):
+        result = self.build()
+        written = sorted(os.path.relpath(path, self.dest) for path in result.written)
+        self.assertEqual(written, [os.path.join(*parts) for parts in [
+            ("pages", "index.html"), ("subdir", "pages", "2", "index.html"), ("subdir", "pages", "index.html"),
+            ("tags", "go", "index.html"), ("tags", "python", "index.html"),
+        ]])
+        self.assertEqual(self.read(os.path.join(self.dest, "subdir", "pages", "index.html")),
+            '<html><title>Sub</title><body><div><h1>Sub</h1><ul><li><a href="/subdir/post1.html">Post 1</a><time>2024-03-01</time></li>'
+            '<li><a href="/subdir/post0.html">Post 0</a><time>2024-01-02</time></li></ul>'
+            '<nav><span>Page 1 of 2</span><a href="/subdir/pages/2/" rel="next">Next</a></nav></div></body></html>')
+        self.assertIn('<a href="/subdir/">Sub</a>', self.read(os.path.join(self.dest, "pages", "index.html")))
+
+    def test_listings_follow_metadata_changes(self):
+        _ = self.build()
+        self.write(os.path.join(self.content, "subdir", "post0.md"), "---\norder: 1\n---\n# First")
+        result = self.build(page_size=10)
+        self.assertEqual(sorted(os.path.relpath(path, self.dest) for path in result.removed), [os.path.join("subdir", "pages", "2", "index.html"), os.path.join("tags", "go", "index.html")])
+        self.assertIn('<ul><li><a href="/subdir/post0.html">First</a></li>', self.read(os.path.join(self.dest, "subdir", "pages", "index.html")))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "tags", "go")))
+
+    def test_titles_match_their_pages(self):
+        self.write(os.path.join(self.content, "subdir", "post0.md"), "# Fish &amp; <em>Chips</em>\n\nBody")
+        _ = generate_pages_parallel(self.content, self.template, self.dest)
+        _ = self.build()
+        title = "Fish &amp; <em>Chips</em>"
+        self.assertIn(f"<title>{title}</title>", self.read(os.path.join(self.dest, "subdir", "post0.html")))
+        self.assertIn(f'<a href="/subdir/post0.html">{title}</a>', self.read(os.path.join(self.dest, "subdir", "pages", "index.html")))
+
+    def test_listing_never_overwrites_a_page(self):
+        os.makedirs(os.path.join(self.content, "tags", "go"))
+        self.write(os.path.join(self.content, "tags", "go", "index.md"), "# Go")
+        with self.assertRaises(Exception):
+            _ = self.build()
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "pages")))
+
+
+class TestDeployManifest(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.deploy_manifest = os.path.join(self.root, "cache", "deploy.json")
+        self.baseline = os.path.join(self.root, "deploy-baseline.json")
+        self.staging = os.path.join(self.root, "staging")
+        _ = generate_pages_parallel(self.content, self.template, self.dest)
+
+    def stage(self):
+        changes = stage_changes(self.dest, self.staging, self.deploy_manifest, self.baseline)
+        with open(os.path.join(self.staging, "changes.json"), "r") as f:
+            self.assertEqual(json.load(f), {"added": changes.added, "modified": changes.modified, "deleted": changes.deleted})
+        return changes
+
+    def test_first_deploy_stages_everything(self):
+        changes = self.stage()
+        self.assertEqual(changes.added, ["index.html", "subdir/index.html"])
+        self.assertEqual(self.read(os.path.join(self.staging, "subdir", "index.html")), self.read(os.path.join(self.dest, "subdir", "index.html")))
+
+    def test_only_changes_since_the_last_deploy_are_staged(self):
+        _ = self.stage()
+        # A rebuild with identical output rewrites files but changes no hashes
+        _ = generate_pages_parallel(self.content, self.template, self.dest)
+        self.assertEqual(update_deploy_manifest(self.dest, self.deploy_manifest, self.baseline).summary(), "0 added, 0 modified, 0 deleted")
+
+        self.write(os.path.join(self.content, "subdir", "index.md"), "# Sub\n\nEdited")
+        _ = generate_pages_parallel(self.content, self.template, self.dest)
+        _ = update_deploy_manifest(self.dest, self.deploy_manifest, self.baseline)
+        # Changes pile up across builds until they are staged
+        os.remove(os.path.join(self.dest, "index.html"))
+        self.write(os.path.join(self.dest, "new.txt"), "x")
+        changes = self.stage()
+        self.assertEqual((changes.added, changes.modified, changes.deleted), (["new.txt"], ["subdir/index.html"], ["index.html"]))
+        self.assertEqual(sorted(os.listdir(self.staging)), ["changes.json", "new.txt", "subdir"])
+        self.assertEqual(self.stage().summary(), "0 added, 0 modified, 0 deleted")
+
+    def test_baseline_survives_a_fresh_checkout(self):
+        _ = self.stage()
+        # CI starts without the ignored cache, but the committed baseline still says what is live
+        os.remove(self.deploy_manifest)
+        self.assertEqual(update_deploy_manifest(self.dest, self.deploy_manifest, self.baseline).summary(), "0 added, 0 modified, 0 deleted")
+
+
+class TestStartup(unittest.TestCase):
+    def test_parse_importtime(self):
+        stderr = "import time: self [us] | cumulative | imported package\nimport time:       120 |        120 |   _json\nimport time:       400 |        520 | json\n"
+        self.assertEqual(parse_importtime(stderr), {"_json": (120, 120), "json": (400, 520)})
+
+    def test_cli_import_skips_heavy_modules(self):
+        import subprocess
+        import sys
+
+        code = "import sys, main; print(' '.join(sorted(sys.modules)))"
+        completed = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+        modules = set(completed.stdout.split())
+        self.assertIn("page_generation", modules)
+        for heavy in ("pydoc", "unittest", "logging", "sqlite3", "http.server", "concurrent.futures"):
+            self.assertNotIn(heavy, modules)
+
+
+if __name__ == "__main__":
+    _ = unittest.main()
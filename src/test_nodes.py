@@ -1,13 +1,12 @@
-import code
-from shlex import quote
-from turtle import heading
-from typing import Text
+import io
 import unittest
 
 from regexing import extract_markdown_images, extract_markdown_links
 from textnode import TextNode, TextType
 from htmlnode import HTMLNode, LeafNode, ParentNode
-from blocktext import markdown_to_blocks, block_to_block_type, markdown_to_html_node
+from blocktext import markdown_to_blocks, block_to_block_type, markdown_to_html_node, scan_blocks
+from template import Slot, Template
+from minify import MinifyingWriter, minify_css, minify_html
 
 class TestTextNode(unittest.TestCase):
     def test_eq(self):
@@ -39,6 +38,14 @@ class TestTextNode(unittest.TestCase):
         self.assertEqual(html_node.value, "")
         self.assertEqual(html_node.props_to_html(), 'src="cool.com" alt="This is an image text node"')
 
+    def test_basepath_prefixes_root_relative_urls(self):
+        link = TextNode("home", TextType.LINK, "/subdir").to_html_node("/site/")
+        image = TextNode("pic", TextType.IMAGE, "/images/x.png").to_html_node("/site/")
+        external = TextNode("ext", TextType.LINK, "https://boot.dev").to_html_node("/site/")
+        self.assertEqual(link.props["href"], "/site/subdir")
+        self.assertEqual(image.props["src"], "/site/images/x.png")
+        self.assertEqual(external.props["href"], "https://boot.dev")
+
     def test_delimiter_split1(self):
         node = TextNode("This is text with a `code block` word", TextType.PLAIN_TEXT)
         new_nodes = TextNode.split_nodes_delimiter([node], "`", TextType.CODE_TEXT)
@@ -65,6 +72,23 @@ class TestTextNode(unittest.TestCase):
         text = "This is text with a link [to boot dev](https://www.boot.dev) and [to youtube](https://www.youtube.com/@bootdotdev)"
         self.assertEqual(extract_markdown_links(text), [("to boot dev", "https://www.boot.dev"), ("to youtube", "https://www.youtube.com/@bootdotdev")])
         
+    def test_extraction_keeps_lazy_match_semantics(self):
+        self.assertEqual(extract_markdown_links("[wiki](https://en.wikipedia.org/wiki/Foo_(bar))"), [("wiki", "https://en.wikipedia.org/wiki/Foo_(bar")])
+        self.assertEqual(extract_markdown_links("[a [b](c)"), [("a [b", "c")])
+        self.assertEqual(extract_markdown_links("[a\nb](c) [d](e\nf) [g](h)"), [("g", "h")])
+        self.assertEqual(extract_markdown_images("![a](b) [c](d)"), [("a", "b")])
+        self.assertEqual(extract_markdown_links("![a](b) [c](d)"), [("c", "d")])
+        # Same targets as the renderer, which is what the split passes used to stand in for
+        text = "see [a [b](c) and ![x](y (z)) end"
+        rendered = [(node.text, node.url) for node in TextNode.nodes_from_text(text) if node.url is not None]
+        self.assertEqual(rendered, extract_markdown_links(text) + extract_markdown_images(text))
+
+    def test_links_inside_images_win(self):
+        # Links were split out before images, so a link starting in an image's alt text or URL breaks the image
+        self.assertEqual(TextNode.nodes_from_text("![a [c](d)"), [TextNode("![a ", TextType.PLAIN_TEXT), TextNode("c", TextType.LINK, "d")])
+        self.assertEqual(TextNode.nodes_from_text("![a](b[c](d)"), [TextNode("![a](b", TextType.PLAIN_TEXT), TextNode("c", TextType.LINK, "d")])
+        self.assertEqual(TextNode.nodes_from_text("![a](b[c) d"), [TextNode("a", TextType.IMAGE, "b[c"), TextNode(" d", TextType.PLAIN_TEXT)])
+
     def test_extract_markdown_images_and_links(self):
         text = "This is text with an ![image](https://i.imgur.com/zjjcJKZ.png), and two links: [link1](cool.com), [link2](cool2.com)"
         image_matches = extract_markdown_images(text)
@@ -141,6 +165,33 @@ class TestTextNode(unittest.TestCase):
 
         self.assertListEqual(TextNode.nodes_from_text(text), expected)
 
+    def test_nodes_from_text_code_shadows_other_delimiters(self):
+        self.assertListEqual(TextNode.nodes_from_text("a `**not bold** _x_` b"), [
+            TextNode("a ", TextType.PLAIN_TEXT),
+            TextNode("**not bold** _x_", TextType.CODE_TEXT),
+            TextNode(" b", TextType.PLAIN_TEXT),
+        ])
+
+    def test_nodes_from_text_bold_shadows_italics(self):
+        self.assertListEqual(TextNode.nodes_from_text("**snake_case** and _it_"), [
+            TextNode("snake_case", TextType.BOLD_TEXT),
+            TextNode(" and ", TextType.PLAIN_TEXT),
+            TextNode("it", TextType.ITALIC_TEXT),
+        ])
+
+    def test_nodes_from_text_repeated_links(self):
+        self.assertListEqual(TextNode.nodes_from_text("[a](b) x [a](b) y"), [
+            TextNode("a", TextType.LINK, "b"),
+            TextNode(" x ", TextType.PLAIN_TEXT),
+            TextNode("a", TextType.LINK, "b"),
+            TextNode(" y", TextType.PLAIN_TEXT),
+        ])
+
+    def test_nodes_from_text_unmatched_brackets(self):
+        self.assertListEqual(TextNode.nodes_from_text("[[[ ![ no link ]( here"), [
+            TextNode("[[[ ![ no link ]( here", TextType.PLAIN_TEXT),
+        ])
+
 class TestHTMLNode(unittest.TestCase):
     def test_props_to_html(self):
         html_node = HTMLNode(props = {"href": "https://www.google.com", "target": "_blank"})
@@ -168,6 +219,34 @@ class TestHTMLNode(unittest.TestCase):
             "<div><span><b>grandchild</b></span></div>",
         )
 
+    def test_write_html_streams_fragments(self):
+        fragments: list[str] = []
+
+        class Recorder:
+            def write(self, fragment: str) -> int:
+                fragments.append(fragment)
+                return len(fragment)
+
+        node = ParentNode("div", [LeafNode("b", "bold"), LeafNode(None, " text")], {"class": "x"})
+        node.write_html(Recorder())
+        self.assertListEqual(fragments, ['<div class="x">', "<b>bold</b>", " text", "</div>"])
+        self.assertEqual(node.to_html(), "".join(fragments))
+
+    def test_default_containers_are_not_shared(self):
+        first = ParentNode("div")
+        second = ParentNode("div")
+        _ = first.add_property("class", "a").add_child(LeafNode("b", "x"))
+        self.assertEqual((second.props, second.children), ({}, []))
+        self.assertEqual(LeafNode("p", "y").props, {})
+
+    def test_nodes_have_no_instance_dict(self):
+        for node in (LeafNode("p", "x"), ParentNode("div", []), HTMLNode(), TextNode("x", TextType.PLAIN_TEXT)):
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_write_html_without_children_raises(self):
+        with self.assertRaises(ValueError):
+            ParentNode("div", []).to_html()
+
 class TestBlockText(unittest.TestCase):
     def test_markdown_to_blocks(self):
         md = """
@@ -274,6 +353,40 @@ This is more regular text
         "<div><p>This is regular text</p><blockquote>This is a quote</blockquote><p>This is more regular text</p></div>"
         )
 
+    def test_codeblock_with_blank_lines(self):
+        md = """Before
+
+```
+first
+
+    indented after a blank line
+```
+
+After
+"""
+        self.assertEqual(markdown_to_blocks(md), ["Before", "```\nfirst\n\n    indented after a blank line\n```", "After"])
+        self.assertEqual(markdown_to_html_node(md).to_html(),
+        "<div><p>Before</p><pre><code>first\n\n    indented after a blank line</code></pre><p>After</p></div>"
+        )
+
+    def test_unclosed_fence_splits_normally(self):
+        md = "```\nnot closed\n\nparagraph"
+        self.assertEqual(markdown_to_blocks(md), ["```\nnot closed", "paragraph"])
+
+    def test_scan_blocks_classifies_while_scanning(self):
+        md = "# Title\n\n- a\n- b\n\n1. x\n2. y\n\n> quote\n\ntext"
+        self.assertListEqual([(block_type.value, lines) for block_type, lines in scan_blocks(md.split("\n"))], [
+            ("heading", ["# Title"]),
+            ("unordered_list", ["- a", "- b"]),
+            ("ordered_list", ["1. x", "2. y"]),
+            ("quote", ["> quote"]),
+            ("paragraph", ["text"]),
+        ])
+
+    def test_long_ordered_list(self):
+        md = "\n".join(f"{i}. item{i}" for i in range(1, 12))
+        self.assertTrue(markdown_to_html_node(md).to_html().endswith("<li>item10</li><li>item11</li></ol></div>"))
+
     def test_headers(self):
         md = """# Title
 
@@ -287,6 +400,44 @@ This is more regular text
         "<div><h1>Title</h1><h2>Header</h2><p>####### Just Regular Text?</p></div>"
         )
 
+class TestTemplate(unittest.TestCase):
+    def test_compile_splits_literals_and_slots(self):
+        template = Template.compile('<title>{{ Title }}</title><link href="/index.css" /><article>{{ Content }}</article>', "/site/")
+        self.assertListEqual(template.segments, ["<title>", Slot.TITLE, '</title><link href="/site/index.css" /><article>', Slot.CONTENT, "</article>"])
+
+    def test_render_does_not_rewrite_content(self):
+        template = Template.compile("<p>{{ Content }}</p>", "/site/")
+        self.assertEqual(template.render({Slot.TITLE: "t", Slot.CONTENT: '<code>href="/x"</code>'}), '<p><code>href="/x"</code></p>')
+
+    def test_write_streams_nodes_into_slots(self):
+        template = Template.compile("<title>{{ Title }}</title>{{ Content }}")
+        buffer = io.StringIO()
+        template.write(buffer, {Slot.TITLE: "t", Slot.CONTENT: ParentNode("div", [LeafNode("p", "x")])})
+        self.assertEqual(buffer.getvalue(), "<title>t</title><div><p>x</p></div>")
+
+class TestMinify(unittest.TestCase):
+    def test_template_whitespace_and_comments_are_dropped(self):
+        html = "<html>\n  <head>\n    <title>T</title>\n  </head>\n  <!-- note -->\n  <body>\n    <p>Some   <b>bold</b>\n text</p>\n  </body>\n</html>\n"
+        self.assertEqual(minify_html(html), "<html><head><title>T</title></head><body><p>Some <b>bold</b> text</p></body></html>")
+
+    def test_pre_content_is_preserved(self):
+        html = "<div>\n  <pre><code>def f():\n    return  1\n<!-- kept --></code></pre>\n</div>"
+        self.assertEqual(minify_html(html), "<div><pre><code>def f():\n    return  1\n<!-- kept --></code></pre></div>")
+
+    def test_markup_split_across_writes(self):
+        buffer = io.StringIO()
+        with MinifyingWriter(buffer) as writer:
+            for piece in ["<p>a", "  ", " b</p", "><!", "-- x --", "><pre>  x", "  </p", "re>  <a href=\"x  y\">", "c</a>"]:
+                _ = writer.write(piece)
+        self.assertEqual(buffer.getvalue(), "<p>a b</p><pre>  x  </pre><a href=\"x  y\">c</a>")
+
+    def test_non_breaking_space_is_kept(self):
+        self.assertEqual(minify_html("<p>a\u00a0 b</p>"), "<p>a\u00a0 b</p>")
+
+    def test_css(self):
+        css = "/* theme */\nbody {\n  color: red;\n  font-family: \"Open  Sans\", serif;\n}\n\n@media screen and (max-width: 600px) {\n  a :hover > b { margin: 0 auto ; }\n}\n"
+        self.assertEqual(minify_css(css), "body{color:red;font-family:\"Open  Sans\",serif}@media screen and (max-width:600px){a :hover>b{margin:0 auto}}")
+
 if __name__ == "__main__":
     _ = unittest.main()
 
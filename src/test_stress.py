@@ -0,0 +1,110 @@
+import gc
+import time
+import unittest
+from collections.abc import Callable
+
+from blocktext import markdown_to_blocks, markdown_to_html_node, block_to_block_type, BlockType
+from regexing import extract_markdown_images, extract_markdown_links
+from textnode import TextNode, TextType
+
+# Doubling the input doubles the work of a linear parser and quadruples a quadratic one,
+# so the ratio separates them whatever the speed of the machine
+GROWTH_LIMIT = 3.0
+ATTEMPTS = 3
+# Inputs are doubled until one parse takes this long, so timer and cache noise stay small beside it
+MIN_SECONDS = 0.01
+SIZE = 10_000
+LIST_LINES = 50_000
+
+
+def time_once(parse: Callable[[str], object], text: str) -> float:
+    start = time.perf_counter()
+    _ = parse(text)
+    return time.perf_counter() - start
+
+def growth(parse: Callable[[str], object], small_text: str, large_text: str, repeat: int = 3) -> tuple[float, float]:
+    small = large = float("inf")
+    # Collections triggered by the allocations grow with the heap and would skew the larger run
+    gc.disable()
+    try:
+        # Interleaved, so a slow patch on the machine hits both sizes rather than one
+        for _ in range(repeat):
+            small = min(small, time_once(parse, small_text))
+            large = min(large, time_once(parse, large_text))
+    finally:
+        gc.enable()
+    return small, large
+
+
+class TestPathologicalInput(unittest.TestCase):
+    def assertLinear(self, make: Callable[[int], str], parse: Callable[[str], object], size: int = SIZE):
+        small_text = make(size)
+        while min(time_once(parse, small_text), time_once(parse, small_text)) < MIN_SECONDS:
+            size *= 2
+            small_text = make(size)
+        large_text = make(2 * size)
+        # Noise only ever inflates a ratio, so the best of a few measurements is kept; a
+        # quadratic parser stays near 4 on every attempt
+        ratios: list[tuple[float, float, float]] = []
+        for _ in range(ATTEMPTS):
+            small, large = growth(parse, small_text, large_text)
+            ratios.append((large / max(small, 1e-9), small, large))
+            if ratios[-1][0] < GROWTH_LIMIT:
+                return
+        ratio, small, large = min(ratios)
+        self.fail(f"time grew {ratio:.1f}x from {size} to {2 * size}: {small * 1000:.1f}ms, {large * 1000:.1f}ms")
+
+    def test_unclosed_brackets(self):
+        for unit in ["[", "![", "[a](", "](", "[a]", "[a](b", "![a](b[c"]:
+            make = lambda n, unit=unit: unit * n + "["
+            self.assertLinear(make, extract_markdown_links)
+            self.assertLinear(make, extract_markdown_images)
+            self.assertLinear(make, TextNode.nodes_from_text)
+        self.assertLinear(lambda n: "[a](" * n, lambda text: TextNode.split_nodes_links([TextNode(text, TextType.PLAIN_TEXT)]))
+        self.assertEqual(extract_markdown_links("[a](" * 10), [])
+        self.assertEqual("".join(node.text for node in TextNode.nodes_from_text("[" * 10)), "[" * 10)
+
+    def test_many_links_split_in_one_pass(self):
+        make = lambda n: " ".join(f"[l{i}](/p/{i}) ![i{i}](/i/{i}.png)" for i in range(n))
+        split = lambda text: TextNode.split_nodes_image(TextNode.split_nodes_links([TextNode(text, TextType.PLAIN_TEXT)]))
+        self.assertLinear(make, split, SIZE // 4)
+        nodes = split(make(100))
+        self.assertEqual(sum(node.text_type == TextType.LINK for node in nodes), 100)
+        self.assertEqual(sum(node.text_type == TextType.IMAGE for node in nodes), 100)
+
+    def test_delimiter_runs(self):
+        for unit in ["**", "*", "_", "`", "!", "**a"]:
+            self.assertLinear(lambda n, unit=unit: unit * n, TextNode.nodes_from_text)
+
+    def test_huge_lists(self):
+        unordered = lambda n: "\n".join(f"- item {i}" for i in range(n))
+        ordered = lambda n: "\n".join(f"{i}. item" for i in range(1, n + 1))
+        render = lambda md: markdown_to_html_node(md).to_html()
+        # 50k then 100k lines
+        self.assertLinear(unordered, block_to_block_type, LIST_LINES)
+        self.assertLinear(unordered, render, LIST_LINES)
+        self.assertLinear(ordered, block_to_block_type, LIST_LINES)
+        self.assertLinear(ordered, render, LIST_LINES)
+        # Breaking the numbering on the last line must not make classification rescan the block
+        self.assertLinear(lambda n: ordered(n) + "\n1. again", block_to_block_type, LIST_LINES)
+
+        self.assertEqual(block_to_block_type(unordered(100)), BlockType.UNORDERED_LIST)
+        self.assertEqual(block_to_block_type(ordered(100) + "\n1. again"), BlockType.PARAGRAPH)
+        self.assertEqual(render(ordered(100)).count("<li>"), 100)
+
+    def test_unclosed_fence_and_blank_runs(self):
+        unclosed = lambda n: "```\n" + "\n\n".join("code" for _ in range(n))
+        self.assertLinear(unclosed, markdown_to_blocks)
+        self.assertEqual(len(markdown_to_blocks(unclosed(100))), 100)
+
+        blank_run = lambda n: "# Title" + "\n" * n + "text"
+        self.assertLinear(blank_run, markdown_to_blocks)
+        self.assertEqual(markdown_to_blocks(blank_run(100)), ["# Title", "text"])
+
+    def test_long_paragraph(self):
+        make = lambda n: "\n".join(f"line {i} with [a link](/x) and **bold" for i in range(n))
+        self.assertLinear(make, lambda md: markdown_to_html_node(md).to_html(), SIZE // 10)
+
+
+if __name__ == "__main__":
+    _ = unittest.main()
@@ -1,8 +1,11 @@
 from enum import Enum
-from pydoc import text
+import re
 from typing import override
 from htmlnode import HTMLNode, LeafNode
-from regexing import extract_markdown_images, extract_markdown_links
+from regexing import scan_markdown_targets
+from template import prefix_url
+
+INLINE_SPECIAL_CHARS = re.compile(r"[\[!`*_]")
 
 class TextType(Enum):
     PLAIN_TEXT = "plain"
@@ -13,6 +16,8 @@ class TextType(Enum):
     IMAGE = "image"
 
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text: str, text_type: TextType, url: str | None = None) -> None:
         self.text: str = text
         self.text_type: TextType = text_type
@@ -28,7 +33,7 @@ class TextNode:
     def __repr__(self) -> str:
         return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
 
-    def to_html_node(self) -> HTMLNode:
+    def to_html_node(self, basepath: str = "/") -> HTMLNode:
         match self.text_type:
             case TextType.PLAIN_TEXT:
                 return LeafNode(None, self.text)
@@ -39,9 +44,9 @@ class TextNode:
             case TextType.CODE_TEXT:
                 return LeafNode("code", self.text)
             case TextType.LINK:
-                return LeafNode("a", self.text, {"href": self.url})
+                return LeafNode("a", self.text, {"href": prefix_url(self.url, basepath)})
             case TextType.IMAGE:
-                return LeafNode("img", "", {"src": self.url, "alt": self.text})
+                return LeafNode("img", "", {"src": prefix_url(self.url, basepath), "alt": self.text})
 
     @staticmethod
     def split_nodes_delimiter(old_nodes: list[TextNode], delimiter: str, text_type: TextType) -> list[TextNode]:
@@ -68,7 +73,7 @@ class TextNode:
         return node_list
 
     @staticmethod
-    def split_nodes_image(old_nodes: list[TextNode]) -> list[TextNode]:
+    def split_nodes_targets(old_nodes: list[TextNode], text_type: TextType) -> list[TextNode]:
         node_list: list[TextNode] = []
 
         for node in old_nodes:
@@ -76,78 +81,132 @@ class TextNode:
                 node_list.append(node)
                 continue
 
-            images = extract_markdown_images(node.text)
-            current_split_text_nodes = [TextNode(node.text, TextType.PLAIN_TEXT)]
-
-            for image in images:
-                current_text = current_split_text_nodes.pop().text
-                image_str = f"![{image[0]}]({image[1]})"
+            # One scan slices the text between matches instead of re-splitting the remainder per match
+            split_nodes: list[TextNode] = []
+            position = 0
+            for start, end, text, url in scan_markdown_targets(node.text, text_type == TextType.IMAGE):
+                split_nodes += [TextNode(node.text[position:start], TextType.PLAIN_TEXT), TextNode(text, text_type, url)]
+                position = end
+            split_nodes.append(TextNode(node.text[position:], TextType.PLAIN_TEXT))
 
-                split_text_list = current_text.split(image_str)
-                current_split_text_nodes += [TextNode(split_text_list[0], TextType.PLAIN_TEXT),
-                                     TextNode(image[0], TextType.IMAGE, image[1]),
-                                     TextNode(split_text_list[1], TextType.PLAIN_TEXT)]
+            if split_nodes[-1].text == "":
+                _ = split_nodes.pop()
+            if split_nodes and split_nodes[0].text == "":
+                _ = split_nodes.pop(0)
 
-            if current_split_text_nodes[-1].text == "":
-                _ = current_split_text_nodes.pop()
-            if current_split_text_nodes[0].text == "":
-                _ = current_split_text_nodes.pop(0)
-
-            node_list += current_split_text_nodes
+            node_list += split_nodes
 
         return node_list
 
+    @staticmethod
+    def split_nodes_image(old_nodes: list[TextNode]) -> list[TextNode]:
+        return TextNode.split_nodes_targets(old_nodes, TextType.IMAGE)
+
     @staticmethod
     def split_nodes_links(old_nodes: list[TextNode]) -> list[TextNode]:
-        node_list: list[TextNode] = []
+        return TextNode.split_nodes_targets(old_nodes, TextType.LINK)
 
-        for node in old_nodes:
-            if node.text_type != TextType.PLAIN_TEXT:
-                node_list.append(node)
+    @staticmethod
+    def nodes_from_text(text: str) -> list[TextNode]:
+        text = strip_and_replace_newlines(text)
+        nodes: list[TextNode] = []
+
+        text_len = len(text)
+        style = TextType.PLAIN_TEXT
+        run_start = 0
+        i = 0
+
+        # Cached results of find("](") and find(")"). Scan positions only move forward, so a cached
+        # hit stays valid until the scan passes it, which keeps link matching linear overall.
+        close_at = -1
+        paren_at = -1
+        # The same for the first link opener inside an image and the brackets that would close it
+        opener_at = -1
+        inner_close_at = -1
+        inner_paren_at = -1
+
+        while i < text_len:
+            special = INLINE_SPECIAL_CHARS.search(text, i)
+            if special is None:
+                break
+            i = special.start()
+            char = text[i]
+
+            # Links and images win over every delimiter, like the old split_nodes_links/image passes
+            if char == "[" or (char == "!" and text.startswith("[", i + 1)):
+                is_image = char == "!"
+                text_start = i + 2 if is_image else i + 1
+
+                if is_image or i == 0 or text[i - 1] != "!":
+                    if close_at < text_start:
+                        close_at = text.find("](", text_start)
+                        close_at = text_len if close_at == -1 else close_at
+                    if close_at < text_len and paren_at < close_at + 2:
+                        paren_at = text.find(")", close_at + 2)
+                        paren_at = text_len if paren_at == -1 else paren_at
+
+                    if is_image and close_at < text_len and paren_at < text_len:
+                        # The old passes split links before images, so a link that starts inside an
+                        # image, in its alt text or its URL, wins and the image is plain text
+                        if opener_at < text_start:
+                            opener_at = next_link_opener(text, text_start)
+                        if opener_at < close_at:
+                            is_image = False
+                        elif opener_at < paren_at:
+                            if inner_close_at <= opener_at:
+                                inner_close_at = text.find("](", opener_at + 1)
+                                inner_close_at = text_len if inner_close_at == -1 else inner_close_at
+                            if inner_close_at < text_len and inner_paren_at < inner_close_at + 2:
+                                inner_paren_at = text.find(")", inner_close_at + 2)
+                                inner_paren_at = text_len if inner_paren_at == -1 else inner_paren_at
+                            is_image = not (inner_close_at < text_len and inner_paren_at < text_len)
+                        if not is_image:
+                            i += 1
+                            continue
+
+                    if close_at < text_len and paren_at < text_len:
+                        if run_start < i:
+                            nodes.append(TextNode(text[run_start:i], style))
+                        nodes.append(TextNode(text[text_start:close_at], TextType.IMAGE if is_image else TextType.LINK, text[close_at + 2:paren_at]))
+                        style = TextType.PLAIN_TEXT
+                        i = run_start = paren_at + 1
+                        continue
+
+                i += 1
                 continue
 
-            links = extract_markdown_links(node.text)
-            current_split_text_nodes = [TextNode(node.text, TextType.PLAIN_TEXT)]
-
-            for link in links:
-                current_text = current_split_text_nodes.pop().text
-                link_str = f"[{link[0]}]({link[1]})"
-
-                split_text_list = current_text.split(link_str)
-                current_split_text_nodes += [TextNode(split_text_list[0], TextType.PLAIN_TEXT),
-                                     TextNode(link[0], TextType.LINK, link[1]),
-                                     TextNode(split_text_list[1], TextType.PLAIN_TEXT)]
-
-            if current_split_text_nodes[-1].text == "":
-                _ = current_split_text_nodes.pop()
-            if current_split_text_nodes[0].text == "":
-                _ = current_split_text_nodes.pop(0)
-
-            node_list += current_split_text_nodes
+            # Code spans shadow bold and italics, bold shadows italics
+            if char == "`":
+                delimiter_len = 1
+                next_style = TextType.PLAIN_TEXT if style == TextType.CODE_TEXT else TextType.CODE_TEXT
+            elif char == "*" and style != TextType.CODE_TEXT and text.startswith("*", i + 1):
+                delimiter_len = 2
+                next_style = TextType.PLAIN_TEXT if style == TextType.BOLD_TEXT else TextType.BOLD_TEXT
+            elif char == "_" and (style == TextType.PLAIN_TEXT or style == TextType.ITALIC_TEXT):
+                delimiter_len = 1
+                next_style = TextType.PLAIN_TEXT if style == TextType.ITALIC_TEXT else TextType.ITALIC_TEXT
+            else:
+                i += 1
+                continue
 
-        return node_list
+            if run_start < i:
+                nodes.append(TextNode(text[run_start:i], style))
+            style = next_style
+            i = run_start = i + delimiter_len
 
-    @staticmethod
-    def nodes_from_text(text: str) -> list[TextNode]:
-        text = strip_and_replace_newlines(text)
-        nodes = [TextNode(text, TextType.PLAIN_TEXT)]
-
-        # Add Links and Images
-        nodes = TextNode.split_nodes_image(
-            TextNode.split_nodes_links(
-                nodes
-            )
-        )
-
-        # Add Code
-        nodes = TextNode.split_nodes_delimiter(nodes, "`", TextType.CODE_TEXT)
-        # Add Bold
-        nodes = TextNode.split_nodes_delimiter(nodes, "**", TextType.BOLD_TEXT)
-        # Add Italics
-        nodes = TextNode.split_nodes_delimiter(nodes, "_", TextType.ITALIC_TEXT)
+        # An unclosed delimiter formats the rest of the text, as the split passes always did
+        if run_start < text_len:
+            nodes.append(TextNode(text[run_start:], style))
 
         return nodes
 
+def next_link_opener(text: str, start: int) -> int:
+    # A "[" right after "!" opens an image, never a link
+    k = text.find("[", start)
+    while k > 0 and text[k - 1] == "!":
+        k = text.find("[", k + 1)
+    return len(text) if k == -1 else k
+
 def strip_and_replace_newlines(text: str) -> str:
     return " ".join(filter(lambda s: s.strip() != "", map(lambda s: s.strip(), text.splitlines())))
 